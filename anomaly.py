@@ -0,0 +1,89 @@
+import bisect
+import datetime
+import math
+import threading
+
+# --- 異常偵測：依 (部門, 星期幾) 維護近 N 天的歷史數值，提交日報時增量更新並即時比對 ---
+
+ANOMALY_METRICS = {
+    '總營業額': "營業額",
+    '工時產值': "工時產值",
+    '人事成本占比': "人事成本占比",
+}
+WINDOW_DAYS = 56          # 往前 8 週，每個星期幾約有 8 筆樣本
+MIN_SAMPLES = 4           # 樣本數不足時不判定，避免新開分店誤報
+Z_THRESHOLD = 2.0         # 偏離平均超過 2 個標準差才列為異常
+MIN_RELATIVE_GAP = 0.1    # 且與平均差距需超過 10%，避免波動極小時的誤報
+
+class AnomalyDetector:
+    def __init__(self, window_days=WINDOW_DAYS, min_samples=MIN_SAMPLES, z_threshold=Z_THRESHOLD):
+        self.window_days = window_days
+        self.min_samples = min_samples
+        self.z_threshold = z_threshold
+        self._lock = threading.Lock()
+        self._dates = {}   # (部門, 星期幾) -> 已排序的日期清單
+        self._values = {}  # (部門, 日期) -> {指標: 數值}
+
+    @classmethod
+    def from_frame(cls, report_df, **kwargs):
+        detector = cls(**kwargs)
+        if report_df is None or report_df.empty:
+            return detector
+        cols = [c for c in ANOMALY_METRICS if c in report_df.columns]
+        day_df = report_df[['部門', '日期'] + cols].dropna(subset=cols)
+        day_df = day_df.drop_duplicates(subset=['部門', '日期'], keep='last')
+        for dept, day, *values in day_df.itertuples(index=False, name=None):
+            day = day.date()
+            detector._values[(dept, day)] = dict(zip(cols, (float(v) for v in values)))
+            detector._dates.setdefault((dept, day.weekday()), []).append(day)
+        for dates in detector._dates.values():
+            dates.sort()
+        return detector
+
+    def update(self, dept, day, values):
+        with self._lock:
+            key = (dept, day.weekday())
+            if (dept, day) not in self._values:
+                bisect.insort(self._dates.setdefault(key, []), day)
+            self._values[(dept, day)] = {m: float(values[m]) for m in ANOMALY_METRICS if m in values}
+
+    def baseline(self, dept, day, metric):
+        # 同部門、同星期幾、報表日前 window_days 天內 (不含當日) 的平均與標準差
+        with self._lock:
+            dates = self._dates.get((dept, day.weekday()), [])
+            lo = bisect.bisect_left(dates, day - datetime.timedelta(days=self.window_days))
+            hi = bisect.bisect_left(dates, day)
+            samples = [self._values[(dept, d)][metric] for d in dates[lo:hi] if metric in self._values[(dept, d)]]
+        n = len(samples)
+        if n == 0:
+            return 0, 0.0, 0.0
+        mean = sum(samples) / n
+        var = sum((v - mean) ** 2 for v in samples) / (n - 1) if n > 1 else 0.0
+        return n, mean, math.sqrt(var)
+
+    def check(self, dept, day, values):
+        alerts = []
+        for metric, label in ANOMALY_METRICS.items():
+            if metric not in values:
+                continue
+            n, mean, std = self.baseline(dept, day, metric)
+            if n < self.min_samples or std <= 0:
+                continue
+            value = float(values[metric])
+            z = (value - mean) / std
+            if abs(z) >= self.z_threshold and abs(value - mean) >= MIN_RELATIVE_GAP * abs(mean):
+                alerts.append({
+                    '指標': metric, '名稱': label, '數值': value, '平均': mean,
+                    '標準差': std, 'z': z, '樣本數': n,
+                })
+        return alerts
+
+def format_alert(alert):
+    direction = "高於" if alert['z'] > 0 else "低於"
+    if alert['指標'] == '人事成本占比':
+        value, mean = f"{alert['數值']*100:.1f}%", f"{alert['平均']*100:.1f}%"
+    elif alert['指標'] == '工時產值':
+        value, mean = f"${alert['數值']:,.0f}/hr", f"${alert['平均']:,.0f}/hr"
+    else:
+        value, mean = f"${alert['數值']:,.0f}", f"${alert['平均']:,.0f}"
+    return f"{alert['名稱']} {value}，{direction}近 {alert['樣本數']} 週同星期平均 {mean}"
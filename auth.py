@@ -0,0 +1,74 @@
+import streamlit as st
+
+# --- 登入邏輯 (營運系統與叫貨系統共用同一份 Users 資料表與同一套比對規則) ---
+
+def _clean(series):
+    # Google Sheets 會把純數字帳號密碼讀成數值，統一轉回字串並去除 .0 與空白
+    return series.astype(str).str.replace(r'\.0$', '', regex=True).str.strip()
+
+def _start_session(user_info):
+    st.session_state.update({
+        "logged_in": True,
+        "user_role": str(user_info.get('權限等級', 'staff')).strip().lower(),
+        "user_name": str(user_info['帳號名稱']).strip(),
+        "dept_access": str(user_info.get('負責部門', '')).strip()
+    })
+
+def login_ui(user_df, title, on_show=None, on_refresh=None):
+    if st.session_state.get("logged_in"): return True
+
+    # 帳號資料為共用快取，複製一份再整理欄位，避免影響其他 session
+    if user_df is not None and not user_df.empty:
+        user_df = user_df.copy()
+        user_df.columns = user_df.columns.astype(str).str.strip()
+        has_columns = '帳號名稱' in user_df.columns and '密碼' in user_df.columns
+    else:
+        has_columns = False
+
+    # 防護網二：自動斷線重連。如果網址內有儲存的帳號參數，自動恢復登入狀態
+    if has_columns:
+        query_u = st.query_params.get("u")
+        if query_u:
+            match = user_df[_clean(user_df['帳號名稱']) == query_u]
+            if not match.empty:
+                _start_session(match.iloc[0])
+                return True
+
+    if on_show:
+        on_show()
+    st.title(title)
+
+    with st.form("login_form"):
+        input_user = st.text_input("帳號名稱")
+        input_pwd = st.text_input("密碼", type="password")
+        if st.form_submit_button("登入"):
+            if user_df is not None and not user_df.empty:
+                if has_columns:
+                    input_user_clean = str(input_user).strip()
+                    input_pwd_clean = str(input_pwd).strip()
+
+                    match = user_df[(_clean(user_df['帳號名稱']) == input_user_clean) & (_clean(user_df['密碼']) == input_pwd_clean)]
+                    if not match.empty:
+                        _start_session(match.iloc[0])
+                        # 成功登入後，將帳號寫入網址以確保斷線可自動重連
+                        st.query_params["u"] = input_user_clean
+                        st.rerun()
+                    else:
+                        st.error("帳號或密碼錯誤。請注意大小寫，並確保無輸入多餘空白。")
+                else:
+                    st.error("資料庫格式錯誤：找不到『帳號名稱』或『密碼』欄位，請檢查 Google Sheets 標題。")
+            else:
+                st.error("系統未能讀取到任何帳號資料。")
+
+    st.write("")
+    if on_refresh and st.button("🔄 無法登入？點此刷新系統資料", use_container_width=True):
+        on_refresh()
+        st.success("資料已重新從 Google Sheets 抓取！請再次嘗試登入。")
+        st.rerun()
+
+    return False
+
+def logout():
+    st.session_state.clear()
+    st.query_params.clear() # 登出時一併清除自動連線網址
+    st.rerun()
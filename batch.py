@@ -0,0 +1,156 @@
+import argparse
+import datetime
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import kpi
+
+# 夜間批次：不需開啟瀏覽器，直接從核心資料庫預先計算各分店日/週/月 KPI
+# 用法：python batch.py --date 2024-05-31 --out kpi_output --images --workers 4
+# 連線金鑰與網頁版相同，讀取 .streamlit/secrets.toml
+
+WEEK_FIELDS = ['總營業額', '總來客數', '總工時', '人事成本', '客單價', '工時產值', '人事成本占比']
+
+def compute_departments(report_df, departments, date, targets):
+    # 全部部門一次以 kpi 向量化彙總計算 (月累計、週彙總)，再依部門取出；回傳 {部門: (日 KPI, 週 KPI, 當日報表列)}
+    day = pd.Timestamp(date)
+    month_start = day.replace(day=1)
+    start_of_week = date - datetime.timedelta(days=date.weekday())
+    end_of_week = start_of_week + datetime.timedelta(days=6)
+    week_start, week_end = pd.Timestamp(start_of_week), pd.Timestamp(end_of_week)
+
+    if report_df.empty:
+        day_rows, day_kpi, month_to_date, week = {}, pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+    else:
+        # 先縮小到本月與本週涵蓋的日期區間，之後的篩選都在這份資料上進行
+        scoped = report_df[report_df['部門'].isin(departments) & (report_df['日期'] >= min(month_start, week_start))
+                           & (report_df['日期'] <= max(day, week_end))]
+        days = scoped['日期'].dt.normalize()
+        day_df = scoped[days == day].drop_duplicates('部門', keep='last')
+        day_rows = dict(zip(day_df['部門'], (row for _, row in day_df.iterrows())))
+        day_kpi = kpi.rollup(day_df, '部門').set_index('部門')
+        month_to_date = kpi.month_to_date_series(scoped[(days >= month_start) & (days <= day)]).groupby('部門').last()
+        week = kpi.weekly_rollup(scoped[(days >= week_start) & (days <= week_end)]).set_index('部門')
+
+    results = {}
+    for department in departments:
+        day_row = day_rows.get(department)
+        month_rev, month_cust = 0.0, 0.0
+        if department in month_to_date.index:
+            month_rev = float(month_to_date.at[department, '月累計營收'])
+            month_cust = float(month_to_date.at[department, '月累計來客'])
+        daily = {
+            '日期': str(date), '部門': department,
+            '總營業額': float(day_row['總營業額']) if day_row is not None else 0.0,
+            '總來客數': float(day_row['總來客數']) if day_row is not None else 0.0,
+            '總工時': float(day_row['總工時']) if day_row is not None else 0.0,
+            '工時產值': float(day_row['工時產值']) if day_row is not None else 0.0,
+            # 人事成本 = 總工時 × 平均時薪，占比計算方式與週彙總、月彙總相同
+            '人事成本': float(day_kpi.at[department, '人事成本']) if department in day_kpi.index else 0.0,
+            '人事成本占比': float(day_kpi.at[department, '人事成本占比']) if department in day_kpi.index else 0.0,
+            '月累計營收': month_rev,
+            '月累計來客': month_cust,
+            '目標占比': kpi.target_ratio(month_rev, targets.get(department, 1000000)),
+        }
+        weekly = {'部門': department, '週起始日': start_of_week, '週結束日': end_of_week,
+                  **{col: 0.0 for col in WEEK_FIELDS}}
+        if department in week.index:
+            weekly.update({col: float(week.at[department, col]) for col in WEEK_FIELDS})
+        results[department] = (daily, weekly, day_row)
+    return results
+
+def render_department_images(out_dir, date, department, daily, day_row):
+    # 圖片生成需要 PIL，只有加上 --images 時才載入
+    from report_images import generate_finance_image, generate_ops_image
+    if day_row is None:
+        return []
+
+    month_cust = daily['月累計來客']
+    month_spend = daily['月累計營收'] / month_cust if month_cust > 0 else 0.0
+    finance_img = generate_finance_image(
+        date, department,
+        daily['月累計營收'], month_cust, month_spend, daily['目標占比'],
+        day_row['總營業額'], day_row['總來客數'], day_row['客單價'],
+        day_row['現金'], day_row['刷卡'], day_row['匯款'], day_row['訂金收入'], day_row['沒收訂金'], day_row['現金折價卷'],
+        day_row['昨日剩'], day_row['今日支出'], day_row['今日補'], day_row['今日剰'],
+        day_row['IKKON折抵券'], day_row['1000折價券'], day_row['總共折抵金'],
+        str(day_row.get('85折使用者', '無')),
+    )
+    ops_img = generate_ops_image(
+        date, department, day_row['工時產值'], day_row['人事成本占比'],
+        day_row['內場工時'], day_row['外場工時'],
+        str(day_row.get('營運回報', '')), str(day_row.get('事項宣達', '')),
+        str(day_row.get('客訴分類標籤', '無')), str(day_row.get('客訴原因與處理結果', '')),
+    )
+
+    paths = []
+    for kind, img_bytes in [("finance", finance_img), ("ops", ops_img)]:
+        path = os.path.join(out_dir, f"{date}_{department}_{kind}.jpg")
+        with open(path, "wb") as f:
+            f.write(img_bytes)
+        paths.append(path)
+    return paths
+
+def run(date, out_dir, departments=None, images=False, workers=4, publish=False):
+    import streamlit as st
+    from data_service import get_data_service
+
+    service = get_data_service(st.secrets)
+    settings_df = service.settings()
+    if settings_df is None or service.reports() is None:
+        print("無法連接至核心資料庫，請檢查授權設定。", file=sys.stderr)
+        return 1
+
+    targets = dict(zip(settings_df['部門'], settings_df['月目標']))
+    departments = departments or list(targets.keys())
+    report_df = service.report_frame()
+    kpis = compute_departments(report_df, departments, date, targets)
+
+    def job(department):
+        daily, weekly, day_row = kpis[department]
+        paths = render_department_images(out_dir, date, department, daily, day_row) if images else []
+        return daily, weekly, paths
+
+    os.makedirs(out_dir, exist_ok=True)
+    # KPI 已在上方一次算完；執行緒只用於產生圖片 (--images)，不加 --images 時直接依序組合結果
+    if images:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(job, departments))
+    else:
+        results = [job(department) for department in departments]
+
+    daily_df = pd.DataFrame([r[0] for r in results])
+    weekly_df = pd.DataFrame([r[1] for r in results])
+    monthly_df = kpi.month_summary(report_df, date.strftime('%Y-%m'), targets)
+
+    daily_df.to_csv(os.path.join(out_dir, f"kpi_daily_{date}.csv"), index=False, encoding="utf-8-sig")
+    weekly_df.to_csv(os.path.join(out_dir, f"kpi_weekly_{date}.csv"), index=False, encoding="utf-8-sig")
+    monthly_df.to_csv(os.path.join(out_dir, f"kpi_monthly_{date:%Y-%m}.csv"), index=False, encoding="utf-8-sig")
+
+    if publish:
+        success, msg = service.update_backend_sheet("KPISnapshot", daily_df.merge(
+            monthly_df.add_prefix('月_').rename(columns={'月_部門': '部門'}), on='部門', how='left'
+        ))
+        if not success:
+            print(f"KPI 快照寫入失敗：{msg}", file=sys.stderr)
+            return 1
+
+    image_count = sum(len(r[2]) for r in results)
+    print(f"完成 {len(departments)} 個部門 KPI 計算，輸出至 {out_dir}" + (f"，共 {image_count} 張圖片" if images else ""))
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="IKKON 夜間 KPI 批次計算")
+    parser.add_argument("--date", type=datetime.date.fromisoformat, default=datetime.date.today() - datetime.timedelta(days=1),
+                        help="結算日期 (預設為昨天)，格式 YYYY-MM-DD")
+    parser.add_argument("--out", default="kpi_output", help="輸出資料夾")
+    parser.add_argument("--departments", nargs="*", help="只計算指定部門 (預設為 Settings 中全部部門)")
+    parser.add_argument("--images", action="store_true", help="同時產生財務與營運日報圖片")
+    parser.add_argument("--workers", type=int, default=4, help="平行產生圖片的執行緒數 (搭配 --images)")
+    parser.add_argument("--publish", action="store_true", help="將結果寫入 KPISnapshot 工作表")
+    args = parser.parse_args(argv)
+    return run(args.date, args.out, args.departments, args.images, args.workers, args.publish)
+
+if __name__ == "__main__":
+    sys.exit(main())
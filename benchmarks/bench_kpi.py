@@ -0,0 +1,143 @@
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# KPI 計算效能量測：以合成資料比較舊版逐群組 / 逐部門計算與 kpi 模組向量化版本的執行時間
+# 新舊結果的一致性由 tests/test_kpi.py 檢查，這裡只計時
+# 用法：python benchmarks/bench_kpi.py --rows 10000 100000 --departments 40 [--json kpi.json]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import kpi
+
+def synthetic_reports(rows, departments, seed=0):
+    # 型別與 kpi.prepare_reports 的輸出相同；每個部門連續日期，並混入 0 值與缺值
+    rng = np.random.default_rng(seed)
+    dept_names = [f"分店{i:02d}" for i in range(departments)]
+    per_dept = -(-rows // departments)
+    dept = np.repeat(dept_names, per_dept)[:rows]
+    day_offset = np.tile(np.arange(per_dept), departments)[:rows]
+    dates = pd.Timestamp("2018-01-01") + pd.to_timedelta(day_offset, unit="D")
+    df = pd.DataFrame({
+        '日期': dates,
+        '部門': dept,
+        '總營業額': rng.integers(0, 200000, rows).astype(float),
+        '總來客數': rng.integers(0, 300, rows).astype(float),
+        '總工時': rng.integers(0, 120, rows).astype(float),
+        '平均時薪': rng.choice([190, 205, 220], rows).astype(float),
+    })
+    df.loc[rng.random(rows) < 0.01, '總工時'] = np.nan
+    return df
+
+# --- 舊版實作 (重構前 main.py / kpi.py)，僅供比較 ---
+
+def legacy_aggregate_daily(df):
+    res = pd.Series(dtype='float64')
+    res['總營業額'] = df['總營業額'].sum()
+    res['總來客數'] = df['總來客數'].sum()
+    res['總工時'] = df['總工時'].sum()
+    daily_cost = (df['總工時'] * df['平均時薪']).sum()
+    res['客單價'] = res['總營業額'] / res['總來客數'] if res['總來客數'] > 0 else 0
+    res['工時產值'] = res['總營業額'] / res['總工時'] if res['總工時'] > 0 else 0
+    res['人事成本數值'] = (daily_cost / res['總營業額'] * 100) if res['總營業額'] > 0 else 0
+    return res
+
+def legacy_daily_rollup(df):
+    chart_df = df.assign(日期標籤=df['日期'].dt.strftime('%Y-%m-%d'))
+    return chart_df.groupby('日期標籤').apply(legacy_aggregate_daily).reset_index()
+
+def legacy_month_summary(df, month_str):
+    month_df = df[df['日期'].dt.strftime('%Y-%m') == month_str]
+    month_df = month_df.assign(人事成本=month_df['總工時'] * month_df['平均時薪'])
+    summary = month_df.groupby('部門')[['總營業額', '總來客數', '總工時', '人事成本']].sum().reset_index()
+    rev = summary['總營業額']
+    summary['工時產值'] = (rev / summary['總工時']).where(summary['總工時'] > 0, 0.0)
+    summary['人事成本占比'] = (summary['人事成本'] / rev).where(rev > 0, 0.0)
+    summary['客單價'] = (rev / summary['總來客數']).where(summary['總來客數'] > 0, 0.0)
+    return summary
+
+def legacy_week_summary(df, department, date):
+    start_of_week = date - datetime.timedelta(days=date.weekday())
+    end_of_week = start_of_week + datetime.timedelta(days=6)
+    mask = (df['部門'] == department) & (df['日期'] >= pd.Timestamp(start_of_week)) & (df['日期'] <= pd.Timestamp(end_of_week))
+    week_df = df.loc[mask]
+    rev, cust, hrs = week_df['總營業額'].sum(), week_df['總來客數'].sum(), week_df['總工時'].sum()
+    return {
+        '總營業額': float(rev), '總來客數': float(cust), '總工時': float(hrs),
+        '客單價': float(rev / cust) if cust > 0 else 0.0,
+        '工時產值': float(rev / hrs) if hrs > 0 else 0.0,
+    }
+
+def legacy_month_to_date(df, department, date):
+    day = pd.Timestamp(date)
+    mask = (df['部門'] == department) & (df['日期'] >= day.replace(day=1)) & (df['日期'] < day)
+    return float(df.loc[mask, '總營業額'].sum()), float(df.loc[mask, '總來客數'].sum())
+
+# --- 計時 ---
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def run_size(rows, departments, repeat, sample_size):
+    df = synthetic_reports(rows, departments)
+    rng = np.random.default_rng(1)
+    picks = rng.choice(len(df), size=min(sample_size, len(df)), replace=False)
+    samples = [(df['部門'].iat[i], df['日期'].iat[i].date()) for i in picks]
+    month_str = df['日期'].iloc[len(df) // 2].strftime('%Y-%m')
+
+    week_keys = df[['部門']].assign(週=df['日期'].dt.normalize() - pd.to_timedelta(df['日期'].dt.weekday, unit='D')).drop_duplicates()
+    results = []
+
+    def add(name, legacy_s, vector_s, note=""):
+        results.append({"rows": rows, "name": name, "legacy_ms": legacy_s * 1000, "vectorized_ms": vector_s * 1000,
+                        "speedup": legacy_s / vector_s if vector_s > 0 else float("inf"), "note": note})
+
+    add("每日彙總 (全品牌)", timed(lambda: legacy_daily_rollup(df), repeat),
+        timed(lambda: kpi.rollup(df.assign(日期標籤=df['日期'].dt.strftime('%Y-%m-%d')), '日期標籤'), repeat))
+    add("月彙總 (各部門)", timed(lambda: legacy_month_summary(df, month_str), repeat),
+        timed(lambda: kpi.month_summary(df, month_str), repeat))
+
+    # 週彙總與月累計的舊版為逐部門、逐日查詢；以抽樣量測單次時間後推估全部 (部門, 週) / (部門, 日) 的總時間
+    per_week = timed(lambda: [legacy_week_summary(df, d, day) for d, day in samples], 1) / len(samples)
+    add("週彙總 (全部部門×週)", per_week * len(week_keys), timed(lambda: kpi.weekly_rollup(df), repeat),
+        f"舊版依 {len(samples)} 次抽樣推估 {len(week_keys):,} 次")
+    per_day = timed(lambda: [legacy_month_to_date(df, d, day) for d, day in samples], 1) / len(samples)
+    add("月累計 (全部部門×日)", per_day * len(df), timed(lambda: kpi.month_to_date_series(df), repeat),
+        f"舊版依 {len(samples)} 次抽樣推估 {len(df):,} 次")
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="KPI 向量化計算效能量測")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="合成資料筆數")
+    parser.add_argument("--departments", type=int, default=40, help="部門數")
+    parser.add_argument("--repeat", type=int, default=3, help="每項量測重複次數 (取中位數)")
+    parser.add_argument("--samples", type=int, default=50, help="舊版抽樣量測的次數")
+    parser.add_argument("--json", help="將結果寫入 JSON 檔")
+    args = parser.parse_args(argv)
+
+    results = []
+    for rows in args.rows:
+        results.extend(run_size(rows, args.departments, args.repeat, args.samples))
+
+    for r in results:
+        print(f"  {r['rows']:>8,} 筆  {r['name']:<18} 舊版 {r['legacy_ms']:10.1f} ms  向量化 {r['vectorized_ms']:8.1f} ms  "
+              f"{r['speedup']:7.1f}x" + (f"  ({r['note']})" if r['note'] else ""))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
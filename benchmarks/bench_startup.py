@@ -0,0 +1,98 @@
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# 冷啟動效能量測：每次都開新的 Python 程序，量測各模組匯入時間與 main.py 登入前必經的匯入成本
+# 用法：python benchmarks/bench_startup.py --repeat 5 [--json startup.json] [--with-data]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = [
+    "streamlit", "pandas", "altair", "PIL.Image", "gspread", "google.oauth2.service_account", "pyarrow",
+]
+
+def top_level_imports(path):
+    # 只取 main.py 最外層的 import，也就是登入畫面出現前一定會執行的匯入
+    tree = ast.parse(open(path, encoding="utf-8").read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+def time_in_subprocess(code):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "error"
+    return elapsed, None
+
+def measure(label, code, repeat, baseline):
+    samples = []
+    for _ in range(repeat):
+        elapsed, error = time_in_subprocess(code)
+        if error:
+            return {"name": label, "error": error}
+        samples.append(elapsed - baseline)
+    return {"name": label, "median_ms": statistics.median(samples) * 1000, "min_ms": min(samples) * 1000}
+
+def measure_data_init(repeat):
+    # 需要 .streamlit/secrets.toml；量測建立連線與讀取 Users (登入畫面所需) 以及完整資料的時間
+    sys.path.insert(0, ROOT)
+    import streamlit as st
+    from database import DatabaseManager
+    from data_service import SID as sid
+    results = []
+    for label, fn in [
+        ("連線 (DatabaseManager)", lambda: DatabaseManager(sid, st.secrets)),
+        ("讀取 Users", lambda: DatabaseManager(sid, st.secrets).get_sheet_records("Users")),
+        ("讀取全部資料", lambda: DatabaseManager(sid, st.secrets).get_all_data()),
+    ]:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+        results.append({"name": label, "median_ms": statistics.median(samples) * 1000, "min_ms": min(samples) * 1000})
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="main.py 冷啟動匯入與初始化時間量測")
+    parser.add_argument("--repeat", type=int, default=5, help="每項量測重複次數 (取中位數)")
+    parser.add_argument("--json", help="將結果寫入 JSON 檔，方便與前次結果比較")
+    parser.add_argument("--with-data", action="store_true", help="一併量測連線與資料載入 (需要連線金鑰)")
+    args = parser.parse_args(argv)
+
+    baseline = statistics.median(time_in_subprocess("pass")[0] for _ in range(args.repeat))
+    login_imports = top_level_imports(os.path.join(ROOT, "main.py"))
+
+    results = [measure(f"import {m}", f"import {m}", args.repeat, baseline) for m in HEAVY_MODULES]
+    results.append(measure(
+        "main.py 登入前匯入 (" + ", ".join(login_imports) + ")",
+        "; ".join(f"import {m}" for m in login_imports), args.repeat, baseline,
+    ))
+    if args.with_data:
+        results.extend(measure_data_init(args.repeat))
+
+    print(f"Python 啟動基準：{baseline*1000:.0f} ms (已自下列結果扣除)")
+    for r in results:
+        if "error" in r:
+            print(f"  {r['name']:<40} 無法量測：{r['error']}")
+        else:
+            print(f"  {r['name']:<40} {r['median_ms']:8.1f} ms (最快 {r['min_ms']:.1f} ms)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"baseline_ms": baseline * 1000, "results": results}, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+import os
+import tempfile
+import threading
+import time
+import pandas as pd
+from database import DatabaseManager, WEEKLY_COLUMNS, PROCUREMENT_COLUMNS, SHEET_KEY_COLUMNS
+from schema import SHEET_COLUMNS, decode_procurement
+import kpi
+
+# --- 共用資料服務：營運系統 (main.py)、叫貨系統 (procurement.py) 與批次使用同一套資料服務，同一程序內共用一個連線與一份快取 ---
+# 任一端寫入後會標記對應資料集過期；同一台主機上的其他程序透過時間戳記檔得知並重新讀取
+
+SID = "16FcpJZLhZjiRreongRDbsKsAROfd5xxqQqQMfAI7H08"
+
+CACHE_TTL = {
+    "users": 3600,
+    "settings": 3600,
+    "reports": 3600,
+    "procurement": 300,
+    "weekly": 3600,
+}
+STAMP_DIR = os.environ.get("IKKON_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ikkon-report-cache"))
+
+LOADERS = {
+    "users": lambda db: db.get_sheet_records("Users"),
+    "settings": lambda db: db.get_sheet_records("Settings"),
+    "reports": lambda db: db.get_report_records(),
+    "procurement": lambda db: db.get_procurement_data(),
+    "weekly": lambda db: db.get_weekly_reports(),
+}
+# 型別化後的 DataFrame：同一份原始資料只轉換一次，所有頁面與衍生索引共用
+DECODERS = {
+    "reports": lambda records: kpi.prepare_reports(records or []),
+    "procurement": decode_procurement,
+}
+
+class _Entry:
+    def __init__(self, value, loaded_at):
+        self.value = value
+        self.loaded_at = loaded_at
+
+class DataService:
+    def __init__(self, sid, secrets):
+        self.db = DatabaseManager(sid, secrets)
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in LOADERS}
+        self._entries = {}
+        self._frames = {}
+        self._generations = {name: 0 for name in LOADERS}
+        self._derived = {}
+
+    # --- 讀取 ---
+    def _stamp_path(self, name):
+        return os.path.join(STAMP_DIR, f"{self.db.sid}.{name}.stamp")
+
+    def _stamp_time(self, name):
+        try:
+            return os.path.getmtime(self._stamp_path(name))
+        except OSError:
+            return 0.0
+
+    def _is_fresh(self, name, entry):
+        if entry is None:
+            return False
+        if time.time() - entry.loaded_at > CACHE_TTL[name]:
+            return False
+        return self._stamp_time(name) <= entry.loaded_at
+
+    def _get(self, name):
+        entry = self._entries.get(name)
+        if self._is_fresh(name, entry):
+            return entry.value
+        # 同一資料集同時只允許一個 session 重新讀取，其他人等待後直接取用
+        with self._load_locks[name]:
+            entry = self._entries.get(name)
+            if self._is_fresh(name, entry):
+                return entry.value
+            # 以開始讀取的時間為準：讀取期間其他程序的寫入會讓時間戳記晚於 loaded_at，下次即重新讀取
+            started = time.time()
+            value = LOADERS[name](self.db)
+            if value is None:
+                # 讀取失敗時沿用舊資料，避免畫面整個中斷
+                return entry.value if entry is not None else None
+            with self._lock:
+                self._entries[name] = _Entry(value, started)
+                self._generations[name] += 1
+                self._frames.pop(name, None)
+            return value
+
+    def users(self):
+        return self._get("users")
+
+    def settings(self):
+        return self._get("settings")
+
+    def reports(self):
+        return self._get("reports")
+
+    def procurement(self):
+        return self._get("procurement")
+
+    def weekly(self):
+        return self._get("weekly")
+
+    def _frame(self, name):
+        value = self._get(name)
+        with self._lock:
+            if name not in self._frames:
+                self._frames[name] = DECODERS[name](value)
+            return self._frames[name]
+
+    def report_frame(self):
+        return self._frame("reports")
+
+    def procurement_frame(self):
+        # 叫貨明細型別化：日期、金額 (去除千分位逗號) 一次轉換，叫貨單彙整與食材成本使用同一份
+        return self._frame("procurement")
+
+    def _source(self, name):
+        return self._frame(name) if name in DECODERS else self._get(name)
+
+    def derived(self, name, builder, sources=("reports",)):
+        # 由快取資料衍生的索引 (週彙總、異常偵測、月底預測、食材成本…)：來源資料重新載入時才重建，平時由呼叫端增量更新
+        # builder 依 sources 順序接收資料，reports 與 procurement 傳入型別化後的 DataFrame
+        inputs = [self._source(source) for source in sources]
+        with self._lock:
+            generation = self._generation_of(sources)
+            cached = self._derived.get(name)
+            if cached is not None and cached[0] == generation:
+                return cached[1]
+        obj = builder(*inputs)
+        # 建立期間若有其他 session 重新載入來源資料，這次的結果只回傳不保存，下次再以新資料建立
+        inputs_now = [self._source(source) for source in sources]
+        with self._lock:
+            if self._generation_of(sources) == generation and all(x is y for x, y in zip(inputs, inputs_now)):
+                self._derived[name] = (generation, obj)
+        return obj
+
+    def peek(self, name, sources=("reports",)):
+        # 只取已建立且來源未重新載入的衍生索引，不觸發讀取或建立；尚未建立時回傳 None (下次使用時自然會以新資料建立)
+        with self._lock:
+            cached = self._derived.get(name)
+            if cached is not None and cached[0] == self._generation_of(sources):
+                return cached[1]
+        return None
+
+    def _generation_of(self, sources):
+        return tuple(self._generations[source] for source in sources)
+
+    def prefetch(self, *names):
+        def run():
+            for name in names:
+                try:
+                    self._get(name)
+                except Exception as e:
+                    print(f"背景預載失敗：{e}")
+        threading.Thread(target=run, daemon=True).start()
+
+    # --- 失效通知 ---
+    def _touch(self, name):
+        try:
+            os.makedirs(STAMP_DIR, exist_ok=True)
+            path = self._stamp_path(name)
+            with open(path, "a"):
+                os.utime(path, None)
+            return os.path.getmtime(path)
+        except OSError:
+            return time.time()
+
+    def invalidate(self, *names):
+        names = names or tuple(LOADERS)
+        for name in names:
+            self._touch(name)
+            with self._lock:
+                self._entries.pop(name, None)
+                self._frames.pop(name, None)
+
+    # --- 寫入：寫入成功後自動更新或標記對應快取 ---
+    def upsert_report(self, sheet_name, date_str, department, new_row):
+        success, action = self.db.upsert_report(sheet_name, date_str, department, new_row)
+        if success and sheet_name == "Sheet1":
+            self._patch_report(new_row)
+        elif success and sheet_name == "WeeklyReports":
+            self._patch_weekly(new_row)
+        return success, action
+
+    def _patch_report(self, new_row):
+        # 本程序直接把新資料套入快取 (不重新讀取整張表)；其他程序則依時間戳記重新讀取
+        stamp = self._touch("reports")
+        record = dict(zip(SHEET_COLUMNS, new_row))
+        key = (str(record['日期']), str(record['部門']))
+        with self._lock:
+            entry = self._entries.get("reports")
+            if entry is None:
+                return
+            records = list(entry.value)
+            for i, r in enumerate(records):
+                if (str(r.get('日期', '')).strip(), str(r.get('部門', '')).strip()) == key:
+                    records[i] = {**r, **record}
+                    break
+            else:
+                records.append(record)
+            entry.value = records
+            entry.loaded_at = max(entry.loaded_at, stamp)
+            self._frames.pop("reports", None)
+
+    def _patch_weekly(self, new_row):
+        stamp = self._touch("weekly")
+        row = [str(v) for v in new_row[:len(WEEKLY_COLUMNS)]]
+        key_cols = [WEEKLY_COLUMNS[c] for c in SHEET_KEY_COLUMNS["WeeklyReports"]]
+        with self._lock:
+            entry = self._entries.get("weekly")
+            if entry is None:
+                return
+            df = entry.value
+            mask = pd.Series(True, index=df.index)
+            for col, value in zip(key_cols, (row[c] for c in SHEET_KEY_COLUMNS["WeeklyReports"])):
+                mask &= df[col].astype(str).str.strip() == value.strip()
+            entry.value = pd.concat([df[~mask], pd.DataFrame([row], columns=WEEKLY_COLUMNS)], ignore_index=True)
+            entry.loaded_at = max(entry.loaded_at, stamp)
+
+    def append_procurement(self, row):
+        success, msg = self.db.append_row("Procurement", row)
+        if success:
+            self._patch_procurement(row)
+        return success, msg
+
+    def _patch_procurement(self, row):
+        # 叫貨單只會新增：本程序直接把新列接到快取尾端 (與讀取時相同的字串欄位)，其他程序依時間戳記重新讀取
+        stamp = self._touch("procurement")
+        width = len(PROCUREMENT_COLUMNS)
+        new_row = ([str(v) for v in row] + [""] * width)[:width]
+        with self._lock:
+            entry = self._entries.get("procurement")
+            if entry is None:
+                return
+            entry.value = pd.concat([entry.value, pd.DataFrame([new_row], columns=PROCUREMENT_COLUMNS)], ignore_index=True)
+            entry.loaded_at = max(entry.loaded_at, stamp)
+            self._frames.pop("procurement", None)
+
+    def update_backend_sheet(self, sheet_name, df):
+        success, msg = self.db.update_backend_sheet(sheet_name, df)
+        if success and sheet_name in ("Users", "Settings"):
+            self.invalidate(sheet_name.lower())
+        return success, msg
+
+_services = {}
+_services_lock = threading.Lock()
+
+def get_data_service(secrets, sid=SID):
+    # 程序內每個試算表只建立一個資料服務
+    with _services_lock:
+        service = _services.get(sid)
+        if service is None:
+            service = DataService(sid, secrets)
+            _services[sid] = service
+        return service
@@ -1,8 +1,114 @@
-import gspread
-from google.oauth2.service_account import Credentials
 import pandas as pd
+import hashlib
+import json
+import time
+import uuid
+from singleflight import SingleFlight, KeyedLock
+from scheduler import get_scheduler, SchedulerTimeout, PRIORITY_WRITE
+
+PROCUREMENT_COLUMNS = ["日期", "部門", "廠商", "品項", "單價", "數量", "總價", "叫貨人", "狀態"]
+WEEKLY_COLUMNS = ["回報日", "部門", "週起始日", "週結束日", "週營收", "客單價", "工時產值",
+                  "數據與營運檢討", "團隊與人事狀況", "行銷觀察與改善建議", "下週行動方針", "填寫人"]
+
+# 每列資料尾端附加的樂觀鎖欄位：版本號每次覆寫 +1，提交編號 = 內容雜湊:單次寫入代碼
+VERSION_COLUMNS = ["版本", "提交編號"]
+SHEET_KEY_COLUMNS = {
+    "Sheet1": (0, 1),              # 日期, 部門
+    "WeeklyReports": (0, 1, 11),   # 回報日, 部門, 填寫人
+}
+MAX_UPSERT_RETRIES = 3
+# 併發新增時落敗的列不在寫入流程中刪除 (刪列會讓其他裝置手上的列號位移)，只在提交編號欄標記為已取代
+SUPERSEDED_PREFIX = "superseded:"
+# 讀取 Sheet1 時附在每筆紀錄上的實際列號 (第 1 列為標題)，去重或快取套用新資料後仍可對應回試算表
+ROW_FIELD = "_列號"
+
+class UpsertConflict(Exception):
+    pass
+
+class UpsertSuperseded(Exception):
+    pass
+
+class UpsertUnresolved(Exception):
+    pass
+
+def col_letter(col_idx):
+    letter = ''
+    while col_idx > 0:
+        col_idx, remainder = divmod(col_idx - 1, 26)
+        letter = chr(65 + remainder) + letter
+    return letter
+
+def submission_digest(sheet_name, new_row):
+    payload = json.dumps([sheet_name] + [str(v) for v in new_row], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+def find_key_rows(all_values, key_cols, key, token_col=None):
+    # token_col 有指定時略過已標記取代的列
+    width = max(key_cols) + 1
+    return [
+        i + 1 for i, row in enumerate(all_values)
+        if i > 0 and len(row) >= width and tuple(str(row[c]).strip() for c in key_cols) == key
+        and (token_col is None or not is_superseded(token_of(row, token_col)))
+    ]
+
+def is_superseded(token):
+    return str(token).startswith(SUPERSEDED_PREFIX)
+
+def row_version(row, version_col):
+    try:
+        return int(float(row[version_col]))
+    except (IndexError, ValueError):
+        return 0
+
+def token_of(row, token_col):
+    return str(row[token_col]).strip() if len(row) > token_col else ""
+
+def token_digest(row, token_col):
+    return token_of(row, token_col).split(":")[0]
+
+def dedupe_reports(report_data):
+    # 舊資料可能因併發寫入而有重複列：同一天同一分店只保留版本號最高 (同版本取最後) 的一列
+    # 已標記取代的列 (併發新增落敗者，等待壓縮清除) 不列入
+    latest = {}
+    superseded = 0
+    for idx, record in enumerate(report_data):
+        record[ROW_FIELD] = idx + 2
+        if is_superseded(record.get("提交編號", "")):
+            superseded += 1
+            continue
+        key = (str(record.get("日期", "")).strip(), str(record.get("部門", "")).strip())
+        version = row_version([record.get("版本", 0)], 0)
+        if key not in latest or version >= latest[key][0]:
+            latest[key] = (version, idx)
+    keep = sorted(idx for _, idx in latest.values())
+    if len(keep) == len(report_data) and not superseded:
+        return report_data
+    return [report_data[idx] for idx in keep]
+
+class _MeteredSheet:
+    # 寫入流程 (版本比對、重試、標記取代、壓縮) 送出的請求數不固定，每個工作表 API 呼叫各自向排程器取得 1 次配額
+    METERED = {"get_all_values", "row_values", "range", "update_cells", "update", "append_row", "delete_rows"}
+
+    def __init__(self, sheet, scheduler, priority=PRIORITY_WRITE):
+        self._sheet = sheet
+        self._scheduler = scheduler
+        self._priority = priority
+
+    def __getattr__(self, name):
+        attr = getattr(self._sheet, name)
+        if name not in self.METERED:
+            return attr
+        def metered(*args, **kwargs):
+            self._scheduler.charge(1, self._priority)
+            return attr(*args, **kwargs)
+        return metered
 
 class DatabaseManager:
+    # 程序內共用：Streamlit 每次重跑都會建立新的 DatabaseManager，但合併與鎖定需跨 session 生效
+    _inflight = SingleFlight()
+    _key_locks = KeyedLock()
+    scheduler = get_scheduler()
+
     def __init__(self, sid, secrets):
         self.sid = sid
         self.secrets = secrets
@@ -10,6 +116,9 @@ class DatabaseManager:
 
     def _connect(self):
         try:
+            # gspread / google-auth 只在真正連線時載入，純計算模組 (kpi、schema) 匯入時不需付出這段成本
+            import gspread
+            from google.oauth2.service_account import Credentials
             scope = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
             creds_info = dict(self.secrets["gcp_service_account"])
             creds_info["private_key"] = creds_info["private_key"].replace("\\n", "\n")
@@ -19,48 +128,364 @@ class DatabaseManager:
             print(f"資料庫連線錯誤：{e}")
             return None
 
+    # --- 對外介面：所有 Sheets API 呼叫都經過共用排程器 (配額控管、相同讀取合併、寫入優先) ---
+    # cost 為該操作實際送出的 API 請求數 (開啟試算表 + 取得工作表 + 讀寫)；請求數不固定的寫入流程只先計開啟的 2 次，
+    # 其餘由 _MeteredSheet 逐次計算
+    def _read(self, key, fn, cost, fallback):
+        if not self.client:
+            return fn()
+        try:
+            return self.scheduler.read((self.sid,) + key, fn, cost=cost)
+        except SchedulerTimeout as e:
+            print(f"資料讀取錯誤：{e}")
+            return fallback
+
+    def _write(self, fn, cost):
+        if not self.client:
+            return fn()
+        try:
+            return self.scheduler.write(fn, cost=cost)
+        except SchedulerTimeout as e:
+            return False, str(e)
+
     def get_all_data(self):
+        return self._read(("get_all_data",), self._get_all_data, 7, (None, None, None))
+
+    def get_report_records(self):
+        return self._read(("reports",), self._get_report_records, 3, None)
+
+    def get_procurement_data(self):
+        return self._read(("procurement",), self._get_procurement_data, 3, None)
+
+    def get_weekly_reports(self):
+        return self._read(("weekly",), self._get_weekly_reports, 3, None)
+
+    def get_sheet_values(self, sheet_name):
+        return self._read(("values", sheet_name), lambda: self._get_sheet_values(sheet_name), 3, None)
+
+    def get_sheet_records(self, sheet_name):
+        return self._read(("records", sheet_name), lambda: self._get_sheet_records(sheet_name), 3, None)
+
+    def get_meta(self, key):
+        return self._read(("meta", key), lambda: self._get_meta(key), 3, None)
+
+    def append_row(self, sheet_name, row):
+        return self._write(lambda: self._append_row(sheet_name, row), 3)
+
+    def update_sheet_range(self, sheet_name, range_name, values):
+        return self._write(lambda: self._update_sheet_range(sheet_name, range_name, values), 3)
+
+    def format_sheet_range(self, sheet_name, range_name, cell_format):
+        return self._write(lambda: self._format_sheet_range(sheet_name, range_name, cell_format), 3)
+
+    def set_meta(self, key, value):
+        return self._write(lambda: self._set_meta(key, value), 4)
+
+    def update_backend_sheet(self, sheet_name, df):
+        return self._write(lambda: self._update_backend_sheet(sheet_name, df), 4)
+
+    def _get_all_data(self):
         if not self.client: 
             return None, None, None
         try:
             sh = self.client.open_by_key(self.sid)
             user_df = pd.DataFrame(sh.worksheet("Users").get_all_records())
             settings_df = pd.DataFrame(sh.worksheet("Settings").get_all_records())
-            report_data = sh.worksheet("Sheet1").get_all_records()
+            report_data = dedupe_reports(sh.worksheet("Sheet1").get_all_records())
             return user_df, settings_df, report_data
         except Exception as e:
             print(f"資料讀取錯誤：{e}")
             return None, None, None
 
+    def _get_report_records(self):
+        if not self.client: 
+            return None
+        try:
+            sh = self.client.open_by_key(self.sid)
+            return dedupe_reports(sh.worksheet("Sheet1").get_all_records())
+        except Exception as e:
+            print(f"資料讀取錯誤：{e}")
+            return None
+
+    def _get_procurement_data(self):
+        if not self.client: 
+            return None
+        try:
+            sh = self.client.open_by_key(self.sid)
+            # 叫貨單以欄位位置讀取，一次抓回全表，避免逐廠商查詢吃掉 API 配額
+            all_values = sh.worksheet("Procurement").get_all_values()
+            if all_values and all_values[0] and all_values[0][0] == "日期":
+                all_values = all_values[1:]
+            width = len(PROCUREMENT_COLUMNS)
+            rows = [(row + [""] * width)[:width] for row in all_values if any(row)]
+            return pd.DataFrame(rows, columns=PROCUREMENT_COLUMNS)
+        except Exception as e:
+            print(f"叫貨資料讀取錯誤：{e}")
+            return None
+
+    def _get_weekly_reports(self):
+        if not self.client: 
+            return None
+        try:
+            sh = self.client.open_by_key(self.sid)
+            # 週報同樣以欄位位置讀取；同一 (回報日, 部門, 填寫人) 只保留版本號最高的一列
+            all_values = sh.worksheet("WeeklyReports").get_all_values()[1:]
+            key_cols = SHEET_KEY_COLUMNS["WeeklyReports"]
+            width = len(WEEKLY_COLUMNS)
+            latest = {}
+            for row in all_values:
+                if not any(row) or is_superseded(token_of(row, width + 1)):
+                    continue
+                key = tuple(str(row[c]).strip() if len(row) > c else "" for c in key_cols)
+                version = row_version(row, width)
+                if key not in latest or version >= latest[key][0]:
+                    latest[key] = (version, (row + [""] * width)[:width])
+            return pd.DataFrame([row for _, row in latest.values()], columns=WEEKLY_COLUMNS)
+        except Exception as e:
+            print(f"週報資料讀取錯誤：{e}")
+            return None
+
     def upsert_daily_report(self, date_str, department, new_row):
+        return self.upsert_report("Sheet1", date_str, department, new_row)
+
+    def upsert_report(self, sheet_name, date_str, department, new_row):
+        if not self.client: return False, "連線失敗"
+        key_cols = SHEET_KEY_COLUMNS.get(sheet_name, (0, 1))
+        key = tuple(str(new_row[c]).strip() for c in key_cols)
+        digest = submission_digest(sheet_name, new_row)
+        # 防重複送出：兩台裝置 (或網路不穩時連點) 送出完全相同的內容，只會真正寫入一次 (也只佔用一次配額)
+        return self._inflight.do(
+            (self.sid, sheet_name, key, digest),
+            lambda: self._write(lambda: self._upsert_with_retry(sheet_name, key_cols, key, new_row, digest), cost=2)
+        )
+
+    def _upsert_with_retry(self, sheet_name, key_cols, key, new_row, digest):
+        try:
+            sheet = self._metered_sheet(sheet_name)
+            with self._key_locks.hold((self.sid, sheet_name, key)):
+                for attempt in range(MAX_UPSERT_RETRIES):
+                    try:
+                        return self._versioned_upsert(sheet, key_cols, key, new_row, digest)
+                    except UpsertConflict as e:
+                        last_conflict = e
+                        time.sleep(0.3 * (attempt + 1))
+            return False, f"資料同時被其他裝置修改，請重新整理後再提交。({last_conflict})"
+        except UpsertSuperseded as e:
+            return False, f"另一台裝置剛送出了同一天的不同內容並已覆蓋本次提交，請重新整理確認後再決定是否覆寫。({e})"
+        except UpsertUnresolved as e:
+            return False, f"資料同時被多台裝置寫入，系統未能確認結果，請重新整理確認後再提交。({e})"
+        except Exception as e:
+            return False, str(e)
+
+    def _versioned_upsert(self, sheet, key_cols, key, new_row, digest):
+        width = len(new_row)
+        token_col = width + 1
+        token = f"{digest}:{uuid.uuid4().hex[:8]}"
+
+        all_values = sheet.get_all_values()
+        self._ensure_version_header(sheet, all_values, width)
+        matches = find_key_rows(all_values, key_cols, key, token_col)
+
+        if matches:
+            row_idx = matches[0]
+            current_row = all_values[row_idx - 1]
+            if token_digest(current_row, token_col) == digest:
+                return True, "updated"
+            self._check_and_write(sheet, row_idx, current_row, new_row, token)
+            return True, "updated"
+
+        sheet.append_row(list(new_row) + [1, token])
+
+        # 新增後重新確認：若另一台裝置同時新增了同一天同一分店，以最上方的有效列為準，
+        # 把本次內容併入該列，再將自己新增的列標記為已取代 (不刪列，避免其他裝置的列號位移)
+        all_values = sheet.get_all_values()
+        matches = find_key_rows(all_values, key_cols, key, token_col)
+        if not matches or token_of(all_values[matches[0] - 1], token_col) == token:
+            return True, "inserted"
+
+        canonical_idx = matches[0]
+        canonical_row = all_values[canonical_idx - 1]
+        try:
+            if token_digest(canonical_row, token_col) != digest:
+                # 併入時使用新的提交編號，之後標記取代才不會找到被併入的那一列
+                merge_token = f"{digest}:{uuid.uuid4().hex[:8]}"
+                self._check_and_write(sheet, canonical_idx, canonical_row, new_row, merge_token)
+        finally:
+            # 不論併入是否成功，自己新增的那一列都要標記取代；衝突時重試會改走更新流程
+            if not self._mark_superseded(sheet, token, token_col):
+                raise UpsertUnresolved(f"無法標記重複新增的列 ({token})")
+        return True, "updated"
+
+    def _check_and_write(self, sheet, row_idx, current_row, new_row, token):
+        width = len(new_row)
+        version_col, token_col = width, width + 1
+        expected_version = row_version(current_row, version_col)
+
+        # 寫入前再讀一次版本號與提交編號，若已被其他裝置改過 (或列號已位移) 就放棄這次寫入並重試
+        latest_row = sheet.row_values(row_idx)
+        if row_version(latest_row, version_col) != expected_version or token_of(latest_row, token_col) != token_of(current_row, token_col):
+            raise UpsertConflict(f"第 {row_idx} 列版本已變更")
+
+        end_col = col_letter(width + 2)
+        cell_list = sheet.range(f"A{row_idx}:{end_col}{row_idx}")
+        values = list(new_row) + [expected_version + 1, token]
+        for j, cell in enumerate(cell_list):
+            if j < len(values):
+                cell.value = values[j]
+        sheet.update_cells(cell_list)
+
+        # 寫入後確認：若讀回的不是自己的提交編號，代表有更新的提交覆蓋了這一列
+        written_row = sheet.row_values(row_idx)
+        written_token = token_of(written_row, token_col)
+        if written_token != token and written_token.split(":")[0] != token.split(":")[0]:
+            raise UpsertSuperseded(f"第 {row_idx} 列已被較新的提交覆蓋")
+
+    def _mark_superseded(self, sheet, token, token_col):
+        # 只改寫提交編號欄；每次都以提交編號重新定位列號，寫入前後各確認一次
+        marker = SUPERSEDED_PREFIX + token
+        cell = col_letter(token_col + 1)
+        for _ in range(MAX_UPSERT_RETRIES):
+            all_values = sheet.get_all_values()
+            own_rows = [i + 1 for i, row in enumerate(all_values) if i > 0 and token_of(row, token_col) in (token, marker)]
+            if not own_rows:
+                return True
+            row_idx = own_rows[0]
+            current = token_of(sheet.row_values(row_idx), token_col)
+            if current == marker:
+                return True
+            if current != token:
+                continue
+            sheet.update(values=[[marker]], range_name=f"{cell}{row_idx}")
+            if token_of(sheet.row_values(row_idx), token_col) == marker:
+                return True
+        return False
+
+    def compact_superseded(self, sheet_name):
+        return self._write(lambda: self._compact_superseded(sheet_name), 2)
+
+    def _compact_superseded(self, sheet_name):
+        # 清除已標記取代的列；由下往上刪除，刪除前再確認該列仍是取代標記。請在無人提交時執行
+        if not self.client:
+            return False, "連線失敗"
+        try:
+            sheet = self._metered_sheet(sheet_name)
+            all_values = sheet.get_all_values()
+            header = all_values[0] if all_values else []
+            if VERSION_COLUMNS[1] not in header:
+                return True, 0
+            token_col = header.index(VERSION_COLUMNS[1])
+            rows = [i + 1 for i, row in enumerate(all_values) if i > 0 and is_superseded(token_of(row, token_col))]
+            removed = 0
+            for row_idx in reversed(rows):
+                if is_superseded(token_of(sheet.row_values(row_idx), token_col)):
+                    sheet.delete_rows(row_idx)
+                    removed += 1
+            return True, removed
+        except Exception as e:
+            return False, str(e)
+
+    def _metered_sheet(self, sheet_name):
+        return _MeteredSheet(self.client.open_by_key(self.sid).worksheet(sheet_name), self.scheduler)
+
+    def _ensure_version_header(self, sheet, all_values, width):
+        header = all_values[0] if all_values else []
+        if header[width:width + 2] != VERSION_COLUMNS:
+            start, end = col_letter(width + 1), col_letter(width + 2)
+            sheet.update(values=[VERSION_COLUMNS], range_name=f"{start}1:{end}1")
+
+    def _get_sheet_values(self, sheet_name):
+        if not self.client: 
+            return None
+        try:
+            sh = self.client.open_by_key(self.sid)
+            return sh.worksheet(sheet_name).get_all_values()
+        except Exception as e:
+            print(f"資料讀取錯誤：{e}")
+            return None
+
+    def _get_sheet_records(self, sheet_name):
+        if not self.client: 
+            return None
+        try:
+            sh = self.client.open_by_key(self.sid)
+            return pd.DataFrame(sh.worksheet(sheet_name).get_all_records())
+        except Exception as e:
+            print(f"資料讀取錯誤：{e}")
+            return None
+
+    def _append_row(self, sheet_name, row):
         if not self.client: 
             return False, "連線失敗"
         try:
             sh = self.client.open_by_key(self.sid)
-            sheet = sh.worksheet("Sheet1")
+            sh.worksheet(sheet_name).append_row(row)
+            return True, "inserted"
+        except Exception as e:
+            return False, str(e)
+
+    def _update_sheet_range(self, sheet_name, range_name, values):
+        if not self.client: 
+            return False, "連線失敗"
+        try:
+            sh = self.client.open_by_key(self.sid)
+            sh.worksheet(sheet_name).update(values=values, range_name=range_name)
+            return True, "success"
+        except Exception as e:
+            return False, str(e)
+
+    def _format_sheet_range(self, sheet_name, range_name, cell_format):
+        if not self.client: 
+            return False, "連線失敗"
+        try:
+            sh = self.client.open_by_key(self.sid)
+            sh.worksheet(sheet_name).format(range_name, cell_format)
+            return True, "success"
+        except Exception as e:
+            return False, str(e)
+
+    def _meta_sheet(self, create=False):
+        import gspread
+        sh = self.client.open_by_key(self.sid)
+        try:
+            return sh.worksheet("Meta")
+        except gspread.WorksheetNotFound:
+            if not create:
+                return None
+            sheet = sh.add_worksheet(title="Meta", rows=20, cols=2)
+            sheet.update(values=[["key", "value"]], range_name="A1")
+            return sheet
+
+    def _get_meta(self, key):
+        if not self.client: 
+            return None
+        try:
+            sheet = self._meta_sheet()
+            if sheet is None:
+                return None
+            for row in sheet.get_all_values()[1:]:
+                if len(row) >= 2 and row[0] == key:
+                    return row[1]
+            return None
+        except Exception as e:
+            print(f"資料讀取錯誤：{e}")
+            return None
+
+    def _set_meta(self, key, value):
+        if not self.client: 
+            return False, "連線失敗"
+        try:
+            sheet = self._meta_sheet(create=True)
             all_values = sheet.get_all_values()
-            target_row_idx = None
-            
             for i, row in enumerate(all_values):
-                if i == 0: continue
-                if len(row) >= 2 and row[0] == date_str and row[1] == department:
-                    target_row_idx = i + 1
-                    break
-            
-            if target_row_idx:
-                cell_list = sheet.range(f"A{target_row_idx}:AD{target_row_idx}")
-                for j, cell in enumerate(cell_list):
-                    if j < len(new_row):
-                        cell.value = new_row[j]
-                sheet.update_cells(cell_list)
-                return True, "updated"
-            else:
-                sheet.append_row(new_row)
-                return True, "inserted"
+                if i > 0 and row and row[0] == key:
+                    sheet.update(values=[[key, value]], range_name=f"A{i + 1}:B{i + 1}")
+                    return True, "updated"
+            sheet.append_row([key, value])
+            return True, "inserted"
         except Exception as e:
             return False, str(e)
 
-    def update_backend_sheet(self, sheet_name, df):
+    def _update_backend_sheet(self, sheet_name, df):
         if not self.client: 
             return False, "連線失敗"
         try:
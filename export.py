@@ -0,0 +1,127 @@
+import io
+import importlib.util
+import os
+import tempfile
+import pandas as pd
+from database import ROW_FIELD
+from schema import decode_reports, COLUMN_TYPES, SHEET_COLUMNS, META_SCHEMA
+
+# --- 報表匯出：依日期區間與部門分批 (chunk) 寫出，不另外建立整份 DataFrame 副本 ---
+
+EXPORT_CHUNK_ROWS = 5000
+
+EXPORT_FORMATS = {
+    "CSV": {"ext": "csv", "mime": "text/csv", "module": None},
+    "Parquet": {"ext": "parquet", "mime": "application/octet-stream", "module": "pyarrow"},
+    "Excel (XLSX)": {"ext": "xlsx", "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "module": "openpyxl"},
+}
+
+def available_formats():
+    return [name for name, spec in EXPORT_FORMATS.items()
+            if spec["module"] is None or importlib.util.find_spec(spec["module"]) is not None]
+
+def iter_report_chunks(report_data, start_date, end_date, departments=None, chunk_size=EXPORT_CHUNK_ROWS, stats=None):
+    # stats 有傳入時累計 "skipped"：日期無法解析、無法判斷是否落在區間內而未匯出的筆數
+    if not report_data:
+        return
+    # 欄位固定為 schema 欄位 (含版本欄) 加上試算表中的其他欄位，剛寫入快取的紀錄缺少版本欄時也不影響欄數
+    columns = SHEET_COLUMNS + [name for name, _ in META_SCHEMA]
+    columns += [col for col in report_data[0] if col not in COLUMN_TYPES and col != ROW_FIELD]
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    dept_set = set(departments) if departments else None
+
+    # 日期區間以 decode_reports 解析後的日期篩選 (與其他頁面相同，手動輸入的 2026/1/7 也算在內)，先依部門分批再解析
+    block = []
+    for record in report_data:
+        if dept_set is not None and record.get('部門') not in dept_set:
+            continue
+        block.append(record)
+        if len(block) >= chunk_size:
+            chunk = _typed_chunk(block, columns, start, end, stats)
+            if not chunk.empty:
+                yield chunk
+            block = []
+    if block:
+        chunk = _typed_chunk(block, columns, start, end, stats)
+        if not chunk.empty:
+            yield chunk
+
+def _typed_chunk(records, columns, start, end, stats=None):
+    # 依 schema 固定各欄與型別，確保各批寫入 Parquet 時 schema 一致、CSV 每列欄數相同
+    # 缺少的欄位依型別補值 (數值 0、日期空值、文字空字串)；schema 以外的欄位一律視為文字
+    df, _ = decode_reports(records)
+    if stats is not None:
+        # decode_reports 會排除日期無法解析的列
+        stats["skipped"] = stats.get("skipped", 0) + len(records) - len(df)
+    if df.empty:
+        return df.reindex(columns=columns)
+    days = df['日期'].dt.normalize()
+    df = df[(days >= start) & (days <= end)].reindex(columns=columns)
+    for col in columns:
+        dtype = COLUMN_TYPES.get(col)
+        if dtype == "date":
+            df[col] = pd.to_datetime(df[col])
+        elif dtype in ("int", "float", "ratio"):
+            df[col] = df[col].fillna(0).astype("float64")
+        else:
+            df[col] = df[col].fillna("").astype(str)
+    return df
+
+def export_reports(report_data, fmt, start_date, end_date, departments=None, chunk_size=EXPORT_CHUNK_ROWS):
+    # 回傳 (暫存檔路徑, 匯出筆數, 日期無法解析而未匯出的筆數)；檔案一律寫在磁碟上不佔記憶體，呼叫端用完後負責刪除
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支援的匯出格式：{fmt}")
+    stats = {"skipped": 0}
+    chunks = iter_report_chunks(report_data, start_date, end_date, departments, chunk_size, stats)
+    writer = {"CSV": _write_csv, "Parquet": _write_parquet, "Excel (XLSX)": _write_xlsx}[fmt]
+    out = tempfile.NamedTemporaryFile(suffix=f".{EXPORT_FORMATS[fmt]['ext']}", delete=False)
+    try:
+        with out:
+            row_count = writer(chunks, out)
+    except Exception:
+        os.remove(out.name)
+        raise
+    return out.name, row_count, stats["skipped"]
+
+def _write_csv(chunks, out):
+    text_out = io.TextIOWrapper(out, encoding="utf-8-sig", newline="")
+    row_count = 0
+    for chunk in chunks:
+        chunk.to_csv(text_out, header=(row_count == 0), index=False)
+        row_count += len(chunk)
+    text_out.flush()
+    text_out.detach()
+    return row_count
+
+def _write_parquet(chunks, out):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    row_count = 0
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(out, table.schema)
+            writer.write_table(table.cast(writer.schema))
+            row_count += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return row_count
+
+def _write_xlsx(chunks, out):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("報表資料")
+    row_count = 0
+    for chunk in chunks:
+        if row_count == 0:
+            ws.append(list(chunk.columns))
+        for row in chunk.itertuples(index=False, name=None):
+            ws.append([None if isinstance(v, float) and pd.isna(v) else v for v in row])
+        row_count += len(chunk)
+    wb.save(out)
+    return row_count
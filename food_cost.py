@@ -0,0 +1,112 @@
+import threading
+import pandas as pd
+
+# --- 食材成本分析：Procurement 叫貨總價 ÷ Sheet1 總營業額，依部門彙總為日 / 週 / 月，並可拆分至廠商 ---
+# 叫貨與營收先各自彙總成 (部門, 日期) 索引，再以索引對齊相除，不逐筆比對
+
+PERIODS = {
+    "日": "day",
+    "週": "week",
+    "月": "month",
+}
+
+def _period_start(dates, period):
+    if period == "week":
+        return dates - pd.to_timedelta(dates.dt.weekday, unit="D")
+    if period == "month":
+        return dates.dt.to_period("M").dt.start_time
+    return dates
+
+def _series(mapping, names):
+    if not mapping:
+        return pd.Series(dtype=float, index=pd.MultiIndex.from_tuples([], names=names))
+    series = pd.Series(mapping, dtype=float)
+    series.index.names = names
+    return series.sort_index()
+
+class FoodCostIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revenue = {}  # (部門, 日期) -> 當日營收
+        self._cost = {}     # (部門, 日期, 廠商) -> 當日叫貨總價
+        self._frames = None
+
+    @classmethod
+    def from_frame(cls, report_df, proc_df):
+        index = cls()
+        if report_df is not None and not report_df.empty:
+            rev = report_df.groupby(['部門', report_df['日期'].dt.normalize()])['總營業額'].sum(min_count=1).dropna()
+            index._revenue = rev.astype(float).to_dict()
+        if proc_df is not None and not proc_df.empty:
+            # proc_df 為 schema.decode_procurement 型別化後的叫貨明細，金額無法解析的列不計入
+            cost_df = proc_df.dropna(subset=['總價'])
+            cost = cost_df.groupby(['部門', cost_df['日期'].dt.normalize(), '廠商'])['總價'].sum()
+            index._cost = cost.astype(float).to_dict()
+        return index
+
+    def set_revenue(self, dept, day, revenue):
+        # 日報提交 (新增或覆寫) 後以當日營收取代舊值
+        with self._lock:
+            self._revenue[(dept, pd.Timestamp(day))] = float(revenue)
+            self._frames = None
+
+    def add_purchase(self, dept, day, vendor, total):
+        with self._lock:
+            key = (dept, pd.Timestamp(day), str(vendor).strip())
+            self._cost[key] = self._cost.get(key, 0.0) + float(total)
+            self._frames = None
+
+    def _indexed(self):
+        # 增量更新只改字典；查詢時才重建 (部門, 日期) 索引的 Series，之後的查詢直接沿用
+        with self._lock:
+            if self._frames is None:
+                revenue = _series(self._revenue, ['部門', '日期'])
+                vendor_cost = _series(self._cost, ['部門', '日期', '廠商'])
+                self._frames = (revenue, vendor_cost)
+            return self._frames
+
+    def _slice(self, series, start, end, departments):
+        if series.empty:
+            return series
+        dates = series.index.get_level_values('日期')
+        mask = pd.Series(True, index=series.index)
+        if start is not None:
+            mask &= dates >= pd.Timestamp(start)
+        if end is not None:
+            mask &= dates <= pd.Timestamp(end)
+        if departments is not None:
+            mask &= series.index.get_level_values('部門').isin(departments)
+        return series[mask.to_numpy()]
+
+    def summary(self, period="day", start=None, end=None, departments=None):
+        # 回傳每個 (部門, 期間) 的叫貨成本、營收與食材成本占比；期間為該日、該週星期一或該月 1 日
+        columns = ['部門', '期間', '叫貨成本', '總營業額', '食材成本占比']
+        revenue, vendor_cost = self._indexed()
+        revenue = self._slice(revenue, start, end, departments)
+        cost = self._slice(vendor_cost, start, end, departments).groupby(level=['部門', '日期']).sum()
+        if revenue.empty and cost.empty:
+            return pd.DataFrame(columns=columns)
+
+        day_df = pd.concat({'叫貨成本': cost, '總營業額': revenue}, axis=1).fillna(0.0).reset_index()
+        day_df['期間'] = _period_start(day_df['日期'], period)
+        result = day_df.groupby(['部門', '期間'], as_index=False).agg(
+            叫貨成本=('叫貨成本', 'sum'),
+            總營業額=('總營業額', 'sum'),
+        )
+        result['食材成本占比'] = (result['叫貨成本'] / result['總營業額']).where(result['總營業額'] > 0, 0.0)
+        return result[columns]
+
+    def vendor_breakdown(self, start=None, end=None, departments=None):
+        # 區間內各部門的廠商叫貨金額，占該部門叫貨總額與營收的比例
+        columns = ['部門', '廠商', '叫貨成本', '占叫貨比', '占營收比']
+        revenue, vendor_cost = self._indexed()
+        cost = self._slice(vendor_cost, start, end, departments)
+        if cost.empty:
+            return pd.DataFrame(columns=columns)
+
+        result = cost.groupby(level=['部門', '廠商']).sum().rename('叫貨成本').reset_index()
+        dept_cost = result.groupby('部門')['叫貨成本'].transform('sum')
+        dept_rev = result['部門'].map(self._slice(revenue, start, end, departments).groupby(level='部門').sum()).fillna(0.0)
+        result['占叫貨比'] = (result['叫貨成本'] / dept_cost).where(dept_cost > 0, 0.0)
+        result['占營收比'] = (result['叫貨成本'] / dept_rev).where(dept_rev > 0, 0.0)
+        return result.sort_values(['部門', '叫貨成本'], ascending=[True, False])[columns].reset_index(drop=True)
@@ -0,0 +1,130 @@
+import datetime
+import numpy as np
+import pandas as pd
+from schema import decode_reports
+
+# --- KPI 計算：營運系統與夜間批次共用，不依賴 Streamlit session ---
+# 所有彙總都走同一組向量化函式：先以具名彙總 (named aggregation) 加總，再一次以 NumPy 計算比率
+
+SUM_FIELDS = ['總營業額', '總來客數', '總工時', '人事成本']
+ROLLUP_COLUMNS = SUM_FIELDS + ['客單價', '工時產值', '人事成本占比', '人事成本數值']
+
+def prepare_reports(report_data):
+    # 型別轉換統一交給 schema.decode_reports；人事成本數值 (百分比數字) 供圖表使用
+    df, _ = decode_reports(report_data)
+    if df.empty:
+        return df
+    if '人事成本占比' in df.columns:
+        df['人事成本數值'] = df['人事成本占比'].fillna(0) * 100
+    return df
+
+def safe_divide(numerator, denominator):
+    # 分母為 0 (或缺值) 時回傳 0，與報表上「無資料顯示 0」的慣例一致
+    num = np.asarray(numerator, dtype=float)
+    den = np.asarray(denominator, dtype=float)
+    out = np.zeros(np.broadcast(num, den).shape)
+    return np.divide(num, den, out=out, where=den > 0)
+
+def with_labor_cost(df):
+    # 人事成本 = 總工時 × 平均時薪 (逐列)，工時或時薪缺值時該列不計入加總
+    return df.assign(人事成本=df['總工時'] * df['平均時薪'])
+
+def add_ratios(frame):
+    rev = frame['總營業額'].to_numpy(dtype=float)
+    frame['客單價'] = safe_divide(rev, frame['總來客數'])
+    frame['工時產值'] = safe_divide(rev, frame['總工時'])
+    frame['人事成本占比'] = safe_divide(frame['人事成本'], rev)
+    frame['人事成本數值'] = frame['人事成本占比'] * 100
+    return frame
+
+def rollup(df, by):
+    # 依 by 欄位 (單一欄位名稱或清單) 彙總營收、來客、工時與人事成本，並計算客單價、工時產值與人事成本占比
+    keys = [by] if isinstance(by, str) else list(by)
+    if df is None or df.empty:
+        return pd.DataFrame(columns=keys + ROLLUP_COLUMNS)
+    frame = with_labor_cost(df).groupby(keys, sort=True, as_index=False).agg(
+        總營業額=('總營業額', 'sum'),
+        總來客數=('總來客數', 'sum'),
+        總工時=('總工時', 'sum'),
+        人事成本=('人事成本', 'sum'),
+    )
+    return add_ratios(frame)[keys + ROLLUP_COLUMNS]
+
+def weekly_rollup(df, by=('部門',)):
+    # ISO 週 (星期一起算) 彙總；週起始日為該週星期一
+    if df is None or df.empty:
+        return pd.DataFrame(columns=list(by) + ['週起始日'] + ROLLUP_COLUMNS)
+    days = df['日期'].dt.normalize()
+    week_df = df.assign(週起始日=days - pd.to_timedelta(days.dt.weekday, unit='D'))
+    return rollup(week_df, list(by) + ['週起始日'])
+
+def month_to_date_series(df):
+    # 各部門每日的當月累計營收與來客 (含當日)，一次 groupby cumsum 算出全部歷史
+    columns = ['部門', '日期', '總營業額', '總來客數', '月累計營收', '月累計來客']
+    if df is None or df.empty:
+        return pd.DataFrame(columns=columns)
+    daily = df.groupby(['部門', df['日期'].dt.normalize()], sort=True, as_index=False).agg(
+        總營業額=('總營業額', 'sum'),
+        總來客數=('總來客數', 'sum'),
+    )
+    month_key = daily['日期'].dt.to_period('M')
+    running = daily.groupby([daily['部門'], month_key])[['總營業額', '總來客數']].cumsum()
+    daily['月累計營收'] = running['總營業額']
+    daily['月累計來客'] = running['總來客數']
+    return daily[columns]
+
+def daily_metrics(cash, card, remit, deposit, forfeit, customers, k_hours, f_hours, avg_rate):
+    total_rev = float(cash + card + remit + deposit + forfeit)
+    total_hrs = float(k_hours + f_hours)
+    return {
+        '總營業額': total_rev,
+        '總工時': total_hrs,
+        '工時產值': float(safe_divide(total_rev, total_hrs)),
+        '人事成本占比': float(safe_divide(total_hrs * avg_rate, total_rev)),
+        '客單價': float(safe_divide(total_rev, customers)),
+    }
+
+def month_to_date(df, department, date, include_day=False):
+    # 當月 1 日至報表日前一天的累計營收與來客；include_day=True 時含報表日當天 (批次結算用)
+    if df is None or df.empty:
+        return 0.0, 0.0
+    day = pd.Timestamp(date)
+    before = (df['日期'] <= day) if include_day else (df['日期'] < day)
+    mask = (df['部門'] == department) & (df['日期'] >= day.replace(day=1)) & before
+    return float(df.loc[mask, '總營業額'].sum()), float(df.loc[mask, '總來客數'].sum())
+
+def target_ratio(month_rev, month_target):
+    return float(safe_divide(month_rev, month_target))
+
+def week_summary(df, department, date):
+    start_of_week = date - datetime.timedelta(days=date.weekday())
+    end_of_week = start_of_week + datetime.timedelta(days=6)
+    result = {'週起始日': start_of_week, '週結束日': end_of_week,
+              '總營業額': 0.0, '總來客數': 0.0, '總工時': 0.0, '人事成本': 0.0,
+              '客單價': 0.0, '工時產值': 0.0, '人事成本占比': 0.0}
+    if df is None or df.empty:
+        return result
+    mask = (df['部門'] == department) & (df['日期'] >= pd.Timestamp(start_of_week)) & (df['日期'] <= pd.Timestamp(end_of_week))
+    week_df = with_labor_cost(df.loc[mask])
+    rev, cust, hrs, cost = week_df[SUM_FIELDS].sum().to_numpy(dtype=float)
+    result.update({
+        '總營業額': float(rev), '總來客數': float(cust), '總工時': float(hrs), '人事成本': float(cost),
+        '客單價': float(safe_divide(rev, cust)),
+        '工時產值': float(safe_divide(rev, hrs)),
+        '人事成本占比': float(safe_divide(cost, rev)),
+    })
+    return result
+
+def month_summary(df, month_str, targets=None):
+    # 以部門彙總當月營收、工時與人事成本；targets 為 {部門: 月目標}
+    columns = ['部門', '總營業額', '總來客數', '總工時', '人事成本', '工時產值', '人事成本占比', '客單價', '達成率']
+    if df is None or df.empty:
+        return pd.DataFrame(columns=columns)
+    year, month = (int(v) for v in month_str.split('-'))
+    month_df = df[(df['日期'].dt.year == year) & (df['日期'].dt.month == month)]
+    if month_df.empty:
+        return pd.DataFrame(columns=columns)
+    summary = rollup(month_df, '部門')
+    target = summary['部門'].map(targets or {}).fillna(0).astype(float)
+    summary['達成率'] = safe_divide(summary['總營業額'], target)
+    return summary[columns]
@@ -1,302 +1,128 @@
 import streamlit as st
 import datetime
-import pandas as pd
-import altair as alt
+import calendar
 import os
-import io
-import urllib.request
-import textwrap
-from PIL import Image, ImageDraw, ImageFont
-from database import DatabaseManager
+import pandas as pd
+from data_service import get_data_service
+import scheduler
+from auth import login_ui, logout
+from report_images import generate_finance_image, generate_ops_image, generate_weekly_image
+from week_index import WeekIndex
+from anomaly import AnomalyDetector, format_alert
+from projection import ProjectionEngine
+from food_cost import FoodCostIndex, PERIODS
+import petty_cash
+from search_index import SearchIndex, DAILY_FIELDS, WEEKLY_FIELDS
+import kpi
+from export import available_formats, export_reports, EXPORT_FORMATS
+from schema import SCHEMA_VERSION, encode_ratio, decode_reports, run_migration
 
 st.set_page_config(page_title="IKKON 經營決策系統", layout="wide")
 
-SHEET_COLUMNS = [
-    "日期", "部門", "現金", "刷卡", "匯款", "訂金收入", "沒收訂金", "現金折價卷", "金額備註",
-    "總營業額", "月營業額", "目標占比", "總來客數", "客單價", 
-    "內場工時", "外場工時", "總工時", "平均時薪", "工時產值", "人事成本占比",
-    "昨日剩", "今日支出", "今日補", "今日剰", 
-    "IKKON折抵券", "1000折價券", "總共折抵金",
-    "85折使用者", "85折對象", 
-    "營運回報", "客訴分類標籤", "客訴原因與處理結果", "事項宣達"
-]
-
-SID = "16FcpJZLhZjiRreongRDbsKsAROfd5xxqQqQMfAI7H08"
-
-class EnhancedDatabaseManager(DatabaseManager):
-    def upsert_report(self, sheet_name, date_str, department, new_row):
-        if not self.client: return False, "連線失敗"
-        try:
-            sh = self.client.open_by_key(self.sid)
-            sheet = sh.worksheet(sheet_name)
-            all_values = sheet.get_all_values()
-            target_row_idx = None
-            
-            for i, row in enumerate(all_values):
-                if i == 0: continue
-                if sheet_name == "WeeklyReports":
-                    author = new_row[-1] 
-                    if len(row) >= 12 and row[0] == date_str and row[1] == department and str(row[11]).strip() == str(author).strip():
-                        target_row_idx = i + 1
-                        break
-                else:
-                    if len(row) >= 2 and row[0] == date_str and row[1] == department:
-                        target_row_idx = i + 1
-                        break
-            
-            if target_row_idx:
-                def get_col_letter(col_idx):
-                    letter = ''
-                    while col_idx > 0:
-                        col_idx, remainder = divmod(col_idx - 1, 26)
-                        letter = chr(65 + remainder) + letter
-                    return letter
-                
-                end_col = get_col_letter(len(new_row))
-                cell_list = sheet.range(f"A{target_row_idx}:{end_col}{target_row_idx}")
-                
-                for j, cell in enumerate(cell_list):
-                    if j < len(new_row):
-                        cell.value = new_row[j]
-                sheet.update_cells(cell_list)
-                return True, "updated"
-            else:
-                sheet.append_row(new_row)
-                return True, "inserted"
-        except Exception as e:
-            return False, str(e)
+COMPLAINT_TAGS = ["餐點品質", "服務態度", "環境衛生", "上菜效率", "訂位系統", "其他"]
+
+# 連線、快取與衍生索引由共用資料服務管理，叫貨系統使用同一份；任一端寫入後另一端會自動重新讀取
+# 營運系統使用自己的 Sheets API 配額份額 (叫貨系統與批次為獨立程序，各有份額)
+scheduler.configure("main")
+service = get_data_service(st.secrets)
+db = service.db
 
-db = EnhancedDatabaseManager(SID, st.secrets)
+# 登入畫面只需要帳號資料，先單獨載入，不必等完整報表歷史
+user_df = service.users()
 
-# 防護網一：延長背景重整週期至 3600 秒 (1小時)，避免打字時背景強制刷新導致斷線崩潰
-@st.cache_data(ttl=3600)
-def load_cached_data():
-    return db.get_all_data()
+# 週彙總索引只在資料重新載入時建立一次，之後由日報提交增量更新，開啟週報頁不再掃描全部歷史
+def get_week_index():
+    return service.derived("week_index", WeekIndex.from_frame)
 
-user_df, settings_df, report_data = load_cached_data()
+# 異常偵測的歷史基準同樣只建立一次，提交日報時增量加入當日數值
+def get_anomaly_detector():
+    return service.derived("anomaly_detector", AnomalyDetector.from_frame)
 
-if user_df is None and settings_df is None:
+# 月底營收預測：星期輪廓一次以向量化方式建立，之後每筆日報增量更新
+def get_projection_engine():
+    return service.derived("projection_engine", ProjectionEngine.from_frame)
+
+# 食材成本：營收與叫貨明細各自索引後對齊相除；叫貨資料重新載入時重建，日報提交時只更新當日營收
+def get_food_cost_index():
+    return service.derived("food_cost", FoodCostIndex.from_frame, sources=("reports", "procurement"))
+
+# 營運知識搜尋：日報與週報文字的倒排索引，第一次開啟搜尋頁時建立，之後隨日報、週報提交增量更新
+def get_search_index():
+    return service.derived("search_index", SearchIndex.from_data, sources=("reports", "weekly"))
+
+# 提交時只更新已建立的索引；尚未建立 (沒人打開過該分頁) 就跳過，避免為了提交而額外讀取叫貨或週報資料
+def peek_food_cost_index():
+    return service.peek("food_cost", sources=("reports", "procurement"))
+
+def peek_search_index():
+    return service.peek("search_index", sources=("reports", "weekly"))
+
+def prefetch_cached_data():
+    # 使用者輸入帳密的同時，在背景預先載入報表資料；登入後若仍在讀取，資料服務會等待同一次讀取
+    if st.session_state.get("prefetch_started"):
+        return
+    st.session_state["prefetch_started"] = True
+    service.prefetch("settings", "reports")
+
+if user_df is None:
     st.error("系統初始化失敗：無法連接至核心資料庫，請檢查網路連線或授權設定。")
     st.stop()
 
-# --- 圖片生成引擎與排版邏輯 ---
-@st.cache_resource
-def get_chinese_font():
-    font_path = "NotoSansCJKtc-Regular.otf"
-    if not os.path.exists(font_path):
-        try:
-            url = "https://raw.githubusercontent.com/googlefonts/noto-cjk/main/Sans/OTF/TraditionalChinese/NotoSansCJKtc-Regular.otf"
-            urllib.request.urlretrieve(url, font_path)
-        except Exception as e:
-            return None
-    try:
-        return ImageFont.truetype(font_path, 28)
-    except:
-        return None
-
-def get_wrapped_lines(text, max_chars=21):
-    if not text:
-        return ["無"]
-    lines = []
-    for paragraph in text.split('\n'):
-        paragraph = paragraph.strip()
-        if not paragraph:
-            lines.append("")
-            continue
-        while len(paragraph) > max_chars:
-            lines.append(paragraph[:max_chars])
-            paragraph = paragraph[max_chars:]
-        if paragraph:
-            lines.append(paragraph)
-    if not lines:
-        return ["無"]
-    return lines
-
-def render_image(content_lines, theme_color=(180, 50, 50)):
-    font = get_chinese_font()
-    if font is None:
-        font = ImageFont.load_default()
-
-    img_height = len(content_lines) * 45 + 80
-    img = Image.new('RGB', (650, img_height), color=(250, 250, 250))
-    draw = ImageDraw.Draw(img)
-
-    y_text = 40
-    for line in content_lines:
-        if "【" in line or "[" in line:
-            draw.text((40, y_text), line, font=font, fill=theme_color) 
-        else:
-            draw.text((40, y_text), line, font=font, fill=(40, 40, 40))  
-        y_text += 45
-
-    buf = io.BytesIO()
-    img.save(buf, format="JPEG", quality=95)
-    return buf.getvalue()
-
-def generate_finance_image(date, dept, month_rev, month_cust, month_spend, ratio, 
-                           today_rev, today_cust, today_spend, 
-                           cash, card, remit, deposit, forfeit, cash_coupon, 
-                           petty_y, petty_e, petty_r, petty_t, ikkon_cp, th_cp, tot_cp, emp_display_str):
-    lines = [
-        "【 IKKON 財務日報 】",
-        f"日期：{date} | 分店：{dept}",
-        "--------------------------------------",
-        "[ 營收指標 ]",
-        f"總營業額：${month_rev:,.0f} | 總來客數：{int(month_cust)} 人",
-        f"平均客單價：${month_spend:,.0f}",
-        f"目標占比：{ratio*100:.1f}%",
-        "",
-        f"今日營收：${today_rev:,.0f} | 今日來客數：{int(today_cust)} 人",
-        f"今日客單價：${today_spend:,.0f}",
-        "",
-        "[ 支付結構 ]",
-        f"現金：${cash:,.0f} | 刷卡：${card:,.0f}",
-        f"匯款：${remit:,.0f} | 訂金：${deposit:,.0f}",
-        f"沒收：${forfeit:,.0f} | 現金券：${cash_coupon:,.0f}",
-        "",
-        "[ 零用金結算 ]",
-        f"昨日剩餘：${petty_y:,.0f} | 今日支出：${petty_e:,.0f}",
-        f"今日補充：${petty_r:,.0f} | 今日剰餘：${petty_t:,.0f}",
-        "",
-        "[ 行銷與折扣 ]",
-        f"IKKON券：${ikkon_cp:,.0f} | 1000折價：${th_cp:,.0f}",
-        f"總折抵金：${tot_cp:,.0f}",
-    ]
-    lines.extend(get_wrapped_lines(f"員工85折：{emp_display_str}"))
-    return render_image(lines)
-
-def generate_ops_image(date, dept, prod, labor, k_hours, f_hours, ops_note, announce, tags_str, reason_action):
-    lines = [
-        "【 IKKON 營運日報 】",
-        f"日期：{date} | 分店：{dept}",
-        "--------------------------------------",
-        "[ 營運指標 ]",
-        f"工時產值：${prod:,.0f}/hr | 人事占比：{labor*100:.1f}%",
-        f"內場工時：{k_hours} hr | 外場工時：{f_hours} hr",
-        "",
-        "[ 營運狀況回報 ]"
-    ]
-    lines.extend(get_wrapped_lines(ops_note))
-    lines.extend(["", "[ 事項宣達 ]"])
-    lines.extend(get_wrapped_lines(announce))
-    lines.extend(["", f"[ 客訴處理 ({tags_str}) ]"])
-    lines.extend(get_wrapped_lines(reason_action))
+def export_ui(key_prefix, dept_options):
+    st.caption("依日期區間與分店分批匯出歷史報表，適合提供會計或大範圍資料分析使用。")
+    today = datetime.date.today()
+    e1, e2, e3 = st.columns([2, 2, 1])
+    with e1:
+        date_range = st.date_input("匯出日期區間", (today.replace(day=1), today), key=f"{key_prefix}_range")
+    with e2:
+        export_depts = st.multiselect("匯出分店", dept_options, default=dept_options, key=f"{key_prefix}_depts")
+    with e3:
+        export_fmt = st.selectbox("檔案格式", available_formats(), key=f"{key_prefix}_fmt")
     
-    return render_image(lines)
-
-def generate_weekly_image(date, dept, start_d, end_d, rev, spend, prod, review, hr_status, market, act1, act2, act3, author):
-    lines = [
-        "【 IKKON 值班主管週報 】",
-        f"回報日：{date} | 分店：{dept}",
-        f"統計區間：{start_d} 至 {end_d}",
-        "--------------------------------------",
-        "[ 本週核心數據 ]",
-        f"本週總營收：${rev:,.0f}",
-        f"平均客單價：${spend:,.0f} | 平均工時產值：${prod:,.0f}/hr",
-        "",
-        "[ 數據與營運檢討 ]"
-    ]
-    lines.extend(get_wrapped_lines(review))
-    lines.extend(["", "[ 團隊與人事狀況 ]"])
-    lines.extend(get_wrapped_lines(hr_status))
-    lines.extend(["", "[ 行銷觀察與改善建議 ]"])
-    lines.extend(get_wrapped_lines(market))
-    lines.extend(["", "[ 下週行動方針 ]"])
-    
-    def append_action(prefix_num, text):
-        w_lines = get_wrapped_lines(text, max_chars=18) 
-        lines.append(f"{prefix_num}. {w_lines[0]}")
-        for wl in w_lines[1:]:
-            lines.append(f"   {wl}") 
-            
-    append_action(1, act1)
-    append_action(2, act2)
-    append_action(3, act3)
+    if len(date_range) != 2 or not export_depts:
+        st.warning("請選擇完整的日期區間與至少一間分店。")
+        return
     
-    lines.extend(["", "--------------------------------------", f"填寫人：{author}"])
-    return render_image(lines, theme_color=(30, 80, 140))
-
-def login_ui(user_df):
-    if st.session_state.get("logged_in"): return True
-    
-    # 防護網二：自動斷線重連。如果網址內有儲存的帳號參數，自動恢復登入狀態
-    if user_df is not None and not user_df.empty:
-        user_df.columns = user_df.columns.astype(str).str.strip()
-        if '帳號名稱' in user_df.columns and '密碼' in user_df.columns:
-            query_u = st.query_params.get("u")
-            if query_u:
-                user_df['帳號名稱_clean'] = user_df['帳號名稱'].astype(str).str.replace(r'\.0$', '', regex=True).str.strip()
-                match = user_df[user_df['帳號名稱_clean'] == query_u]
-                if not match.empty:
-                    user_info = match.iloc[0]
-                    st.session_state.update({
-                        "logged_in": True, 
-                        "user_role": str(user_info.get('權限等級', 'staff')).strip().lower(), 
-                        "user_name": str(user_info['帳號名稱']).strip(), 
-                        "dept_access": str(user_info.get('負責部門', '')).strip()
-                    })
-                    return True
-
-    st.title("IKKON 系統管理登入")
-    
-    with st.form("login_form"):
-        input_user = st.text_input("帳號名稱")
-        input_pwd = st.text_input("密碼", type="password")
-        if st.form_submit_button("登入"):
-            if user_df is not None and not user_df.empty:
-                user_df.columns = user_df.columns.astype(str).str.strip()
-                
-                if '帳號名稱' in user_df.columns and '密碼' in user_df.columns:
-                    user_df['帳號名稱_clean'] = user_df['帳號名稱'].astype(str).str.replace(r'\.0$', '', regex=True).str.strip()
-                    user_df['密碼_clean'] = user_df['密碼'].astype(str).str.replace(r'\.0$', '', regex=True).str.strip()
-                    
-                    input_user_clean = str(input_user).strip()
-                    input_pwd_clean = str(input_pwd).strip()
-                    
-                    match = user_df[(user_df['帳號名稱_clean'] == input_user_clean) & (user_df['密碼_clean'] == input_pwd_clean)]
-                    if not match.empty:
-                        user_info = match.iloc[0]
-                        safe_role = str(user_info.get('權限等級', 'staff')).strip().lower()
-                        safe_dept = str(user_info.get('負責部門', '')).strip()
-                        
-                        st.session_state.update({
-                            "logged_in": True, 
-                            "user_role": safe_role, 
-                            "user_name": str(user_info['帳號名稱']).strip(), 
-                            "dept_access": safe_dept
-                        })
-                        # 成功登入後，將帳號寫入網址以確保斷線可自動重連
-                        st.query_params["u"] = input_user_clean
-                        st.rerun()
-                    else:
-                        st.error("帳號或密碼錯誤。請注意大小寫，並確保無輸入多餘空白。")
-                else:
-                    st.error("資料庫格式錯誤：找不到『帳號名稱』或『密碼』欄位，請檢查 Google Sheets 標題。")
+    if st.button("產生匯出檔", key=f"{key_prefix}_run"):
+        with st.spinner("資料匯出中..."):
+            export_path, row_count, skipped = export_reports(report_data, export_fmt, date_range[0], date_range[1], export_depts)
+        try:
+            if skipped:
+                st.warning(f"有 {skipped} 筆資料的日期無法解析，未包含在匯出檔中；請通知管理員至「資料格式檢查」查看並修正。")
+            if row_count == 0:
+                st.info("此區間沒有符合條件的資料。")
             else:
-                st.error("系統未能讀取到任何帳號資料。")
-                
-    st.write("")
-    if st.button("🔄 無法登入？點此刷新系統資料", use_container_width=True):
-        st.cache_data.clear()
-        st.success("資料已重新從 Google Sheets 抓取！請再次嘗試登入。")
-        st.rerun()
-        
-    return False
-
-if login_ui(user_df):
+                spec = EXPORT_FORMATS[export_fmt]
+                # 直接交給下載按鈕讀取暫存檔，不先複製成 bytes
+                with open(export_path, "rb") as export_file:
+                    st.download_button(
+                        f"下載 {row_count:,} 筆資料 ({export_fmt})", export_file,
+                        file_name=f"IKKON_報表_{date_range[0]}_{date_range[1]}.{spec['ext']}",
+                        mime=spec['mime'], key=f"{key_prefix}_download"
+                    )
+        finally:
+            os.remove(export_path)
+
+if login_ui(user_df, "IKKON 系統管理登入", on_show=prefetch_cached_data, on_refresh=lambda: service.invalidate("users")):
+    settings_df = service.settings()
+    report_data = service.reports()
+    if settings_df is None or report_data is None:
+        st.error("系統初始化失敗：無法連接至核心資料庫，請檢查網路連線或授權設定。")
+        st.stop()
+    
     TARGETS = dict(zip(settings_df['部門'], settings_df['月目標']))
     HOURLY_RATES = dict(zip(settings_df['部門'], settings_df['平均時薪']))
     
     user_role = st.session_state.get("user_role").lower()
     
     if user_role == "admin":
-        menu_options = ["營運數據登記", "值班主管週報", "月度損益彙總", "系統後台管理"]
+        menu_options = ["營運數據登記", "值班主管週報", "月度損益彙總", "營運知識搜尋", "系統後台管理"]
     elif user_role == "ceo":
-        menu_options = ["月度損益彙總"]
+        menu_options = ["月度損益彙總", "營運知識搜尋"]
     elif user_role == "manager":
-        menu_options = ["營運數據登記", "值班主管週報", "月度損益彙總"]
+        menu_options = ["營運數據登記", "值班主管週報", "月度損益彙總", "營運知識搜尋"]
     else: 
-        menu_options = ["營運數據登記", "月度損益彙總"]
+        menu_options = ["營運數據登記", "月度損益彙總", "營運知識搜尋"]
 
     with st.sidebar:
         st.title(f"{st.session_state['user_name']}")
@@ -305,28 +131,25 @@ if login_ui(user_df):
         mode = st.radio("功能選單", menu_options)
         
         if st.button("刷新數據"):
-            st.cache_data.clear()
+            service.invalidate()
             st.rerun()
         if st.button("安全登出"):
-            st.session_state.clear()
-            st.query_params.clear() # 登出時一併清除自動連線網址
-            st.rerun()
+            logout()
 
     if mode == "系統後台管理":
         st.title("系統後台管理")
         st.info("此區塊修改將直接覆寫核心資料庫。新增分店、修改目標或新增員工帳號皆在此完成。")
         
-        tab_users, tab_settings = st.tabs(["帳號與權限管理", "分店營運設定"])
+        tab_users, tab_settings, tab_export, tab_petty, tab_schema, tab_quota = st.tabs(["帳號與權限管理", "分店營運設定", "歷史資料匯出", "零用金對帳", "資料格式檢查", "API 配額監控"])
         
         with tab_users:
             st.subheader("使用者名單")
             st.caption("權限等級規範：admin (管理員) / ceo (執行長) / manager (值班主管) / staff (幹部)。")
             edited_users = st.data_editor(user_df, num_rows="dynamic", use_container_width=True, key="user_editor")
             if st.button("儲存帳號設定", type="primary"):
-                success, msg = db.update_backend_sheet("Users", edited_users)
+                success, msg = service.update_backend_sheet("Users", edited_users)
                 if success:
                     st.success("帳號資料已成功同步至資料庫。")
-                    st.cache_data.clear()
                 else:
                     st.error(f"寫入失敗：{msg}")
 
@@ -334,13 +157,94 @@ if login_ui(user_df):
             st.subheader("各分店目標與時薪基準")
             edited_settings = st.data_editor(settings_df, num_rows="dynamic", use_container_width=True, key="setting_editor")
             if st.button("儲存營運設定", type="primary"):
-                success, msg = db.update_backend_sheet("Settings", edited_settings)
+                success, msg = service.update_backend_sheet("Settings", edited_settings)
                 if success:
                     st.success("營運設定已成功同步至資料庫。")
-                    st.cache_data.clear()
                 else:
                     st.error(f"寫入失敗：{msg}")
 
+        with tab_export:
+            st.subheader("歷史報表匯出")
+            export_ui("admin_export", list(TARGETS.keys()))
+
+        with tab_petty:
+            st.subheader("零用金鏈結對帳")
+            st.caption("檢查全部歷史日報：昨日剩是否等於同分店前一筆的今日剰、是否有未回報的日期，以及 昨日剩 - 今日支出 + 今日補 是否等於今日剰。")
+            petty_issues = petty_cash.reconcile(service.report_frame())
+            if petty_issues.empty:
+                st.success("所有分店的零用金紀錄皆已對上。")
+            else:
+                st.dataframe(petty_cash.summarize(petty_issues), use_container_width=True, hide_index=True)
+                p1, p2 = st.columns(2)
+                with p1:
+                    petty_types = st.multiselect("問題類型", list(petty_cash.ISSUE_TYPES.values()), default=["鏈結中斷", "金額不符"])
+                with p2:
+                    petty_depts = st.multiselect("分店", sorted(petty_issues['部門'].unique()))
+                petty_view = petty_issues[petty_issues['問題類型'].isin(petty_types)]
+                if petty_depts:
+                    petty_view = petty_view[petty_view['部門'].isin(petty_depts)]
+                petty_view = petty_view.assign(
+                    日期=petty_view['日期'].dt.strftime('%Y-%m-%d'),
+                    前一筆日期=petty_view['前一筆日期'].dt.strftime('%Y-%m-%d'),
+                )
+                st.dataframe(petty_view.iloc[::-1], use_container_width=True, hide_index=True)
+                st.caption("修正方式：至 Google Sheets 更正對應日期的零用金欄位，或以管理員身分於「營運數據登記」覆寫該日報表。")
+
+        with tab_quota:
+            st.subheader("Google Sheets API 配額使用狀況")
+            st.caption(f"以下為營運系統程序的配額桶 (服務帳號每分鐘上限 {scheduler.SHEETS_QUOTA_PER_MINUTE} 次，營運系統分得 {db.scheduler.quota_per_minute} 次；叫貨系統與批次為獨立程序，各自使用其餘份額)。"
+                       "本系統所有使用者共用此配額桶；寫入請求優先於儀表板讀取，寫入流程的每次讀寫與重試都逐次計入，多人同時讀取相同資料時只會實際送出一次。")
+            usage = db.scheduler.usage()
+            q1, q2, q3 = st.columns(3)
+            q1.metric("近 60 秒請求數", f"{usage['used_last_minute']:.0f} / {usage['quota_per_minute']}")
+            q2.metric("目前可用額度", f"{usage['tokens_available']:.1f}")
+            q3.metric("排隊中 (寫入 / 讀取)", f"{usage['waiting_writes']} / {usage['waiting_reads']}")
+            st.progress(min(usage['used_last_minute'] / usage['quota_per_minute'], 1.0))
+            q4, q5, q6, q7 = st.columns(4)
+            q4.metric("累計讀取", usage['reads'])
+            q5.metric("合併的重複讀取", usage['coalesced'])
+            q6.metric("累計寫入", usage['writes'])
+            q7.metric("因配額等待次數", usage['throttled'], help=f"最長等待 {usage['max_wait']:.1f} 秒，逾時 {usage['timeouts']} 次")
+            if st.button("更新配額狀態"):
+                st.rerun()
+
+        with tab_schema:
+            st.subheader("Sheet1 資料格式檢查")
+            st.caption(f"系統格式版本 v{SCHEMA_VERSION}：比例欄位 (目標占比、人事成本占比) 以數值儲存。無法解析的儲存格會列在下方，請至 Google Sheets 修正，系統不會自動當作 0 計算。")
+            _, schema_issues = decode_reports(report_data)
+            if schema_issues.empty:
+                st.success("目前載入的資料全部符合格式規範。")
+            else:
+                st.warning(f"共有 {len(schema_issues)} 個儲存格無法解析。")
+                st.dataframe(schema_issues, use_container_width=True, hide_index=True)
+            
+            s1, s2 = st.columns(2)
+            with s1:
+                if st.button("檢查舊資料移轉狀態", use_container_width=True):
+                    success, summary, _ = run_migration(db, apply=False)
+                    (st.info if success else st.error)(summary)
+            with s2:
+                if st.button("執行格式移轉", type="primary", use_container_width=True):
+                    with st.spinner("正在轉換舊資料格式..."):
+                        success, summary, _ = run_migration(db, apply=True)
+                    if success:
+                        st.success(summary)
+                        service.invalidate("reports")
+                    else:
+                        st.error(f"移轉失敗：{summary}")
+            
+            st.markdown("##### 清除重複提交留下的取代列")
+            st.caption("多台裝置同時新增同一天報表時，落敗的那一列只會標記為「已取代」而不會立即刪除 (系統讀取時已自動略過)。請在無人提交報表的時段執行清除。")
+            if st.button("清除已取代的列", use_container_width=True):
+                with st.spinner("清除中..."):
+                    compact_results = [(name, db.compact_superseded(name)) for name in ["Sheet1", "WeeklyReports"]]
+                for name, (success, result) in compact_results:
+                    if success:
+                        st.success(f"{name}：已清除 {result} 列。")
+                    else:
+                        st.error(f"{name} 清除失敗：{result}")
+                service.invalidate("reports", "weekly")
+
     elif mode == "營運數據登記":
         st.title("營運數據登記")
         dept_options = list(TARGETS.keys()) if st.session_state['dept_access'] == "ALL" else [st.session_state['dept_access']]
@@ -350,17 +254,14 @@ if login_ui(user_df):
         month_target = TARGETS.get(department, 1000000)
         
         last_petty_cash = 0
-        df_history = pd.DataFrame() 
-        if report_data:
-            df_history = pd.DataFrame(report_data)
-            if not df_history.empty and '今日剰' in df_history.columns:
-                df_history['日期'] = pd.to_datetime(df_history['日期'])
-                past_history = df_history[(df_history['部門'] == department) & (df_history['日期'] < pd.to_datetime(date))]
-                past_history = past_history.sort_values(by='日期', ascending=False)
-                if not past_history.empty:
-                    last_value = past_history.iloc[0]['今日剰']
-                    if pd.notna(last_value) and str(last_value).strip() != "":
-                        last_petty_cash = int(float(last_value))
+        df_history = service.report_frame()
+        if not df_history.empty and '今日剰' in df_history.columns:
+            past_history = df_history[(df_history['部門'] == department) & (df_history['日期'] < pd.to_datetime(date))]
+            past_history = past_history.sort_values(by='日期', ascending=False)
+            if not past_history.empty:
+                last_value = past_history.iloc[0]['今日剰']
+                if pd.notna(last_value):
+                    last_petty_cash = int(last_value)
 
         data_exists_warning = False
         existing_rev_display = 0
@@ -370,10 +271,8 @@ if login_ui(user_df):
             
             if not existing_row.empty:
                 data_exists_warning = True
-                try:
-                    existing_rev_display = int(pd.to_numeric(existing_row.iloc[0]['總營業額'], errors='coerce'))
-                except:
-                    existing_rev_display = 0
+                existing_rev = existing_row.iloc[0]['總營業額']
+                existing_rev_display = int(existing_rev) if pd.notna(existing_rev) else 0
 
         st.subheader("營收數據")
         
@@ -463,36 +362,38 @@ if login_ui(user_df):
         
         col_c1, col_c2 = st.columns([1, 2])
         with col_c1:
-            tags = st.multiselect("客訴分類", ["餐點品質", "服務態度", "環境衛生", "上菜效率", "訂位系統", "其他"])
+            tags = st.multiselect("客訴分類", COMPLAINT_TAGS)
             tags_str = ", ".join(tags) if tags else "無"
         with col_c2:
             # 防護網三：綁定記憶金鑰
             reason_action = st.text_area("原因與處理結果", height=80, key="daily_reason_action")
 
-        total_rev = float(cash + card + remit + deposit + forfeit)
-        total_hrs = float(k_hours + f_hours)
-        productivity = float(total_rev / total_hrs) if total_hrs > 0 else 0.0
-        labor_ratio = float((total_hrs * avg_rate) / total_rev) if total_rev > 0 else 0.0
-        avg_customer_spend = float(total_rev / customers) if customers > 0 else 0.0
-
-        current_month_rev = total_rev
-        current_month_cust = customers
-        
-        if report_data:
-            raw_df = pd.DataFrame(report_data)
-            if not raw_df.empty:
-                raw_df['日期'] = pd.to_datetime(raw_df['日期'])
-                current_month_str = date.strftime('%Y-%m')
-                mask = (raw_df['部門'] == department) & (raw_df['日期'].dt.strftime('%Y-%m') == current_month_str) & (raw_df['日期'] < pd.to_datetime(date))
-                
-                historical_month_rev = float(pd.to_numeric(raw_df.loc[mask, '總營業額'], errors='coerce').fillna(0).sum())
-                historical_month_cust = float(pd.to_numeric(raw_df.loc[mask, '總來客數'], errors='coerce').fillna(0).sum())
-                
-                current_month_rev += historical_month_rev
-                current_month_cust += historical_month_cust
+        today_kpi = kpi.daily_metrics(cash, card, remit, deposit, forfeit, customers, k_hours, f_hours, avg_rate)
+        total_rev = today_kpi['總營業額']
+        total_hrs = today_kpi['總工時']
+        productivity = today_kpi['工時產值']
+        labor_ratio = today_kpi['人事成本占比']
+        avg_customer_spend = today_kpi['客單價']
+
+        historical_month_rev, historical_month_cust = kpi.month_to_date(df_history, department, date)
+        current_month_rev = total_rev + historical_month_rev
+        current_month_cust = customers + historical_month_cust
         
-        target_ratio = float(current_month_rev / month_target) if month_target > 0 else 0.0
+        target_ratio = kpi.target_ratio(current_month_rev, month_target)
         current_month_spend = float(current_month_rev / current_month_cust) if current_month_cust > 0 else 0.0
+        
+        # 尚未輸入營收時不代入 0：已回報的日子沿用已存營收，未回報的日子以星期輪廓推估
+        entered_rev = total_rev if total_rev > 0 else None
+        projection = get_projection_engine().project(department, date, month_target, today_revenue=entered_rev)
+        st.subheader("本月目標進度")
+        g1, g2, g3 = st.columns(3)
+        g1.metric("目標占比", f"{target_ratio*100:.1f}%", help=f"本月累計 ${current_month_rev:,.0f} / 月目標 ${month_target:,.0f}")
+        g2.metric("預估月底營收", f"${projection['預估月底營收']:,.0f}",
+                  delta=f"預估達成率 {projection['預估達成率']*100:.1f}%",
+                  delta_color="normal" if projection['預估達成率'] >= 1 else "inverse")
+        g3.metric("達標所需日均", f"${projection['達標所需日均']:,.0f}",
+                  delta=f"近期同星期日均 ${projection['輪廓日均']:,.0f}", delta_color="off")
+        st.caption(f"預估依據：本月剩餘 {projection['剩餘天數']} 天，以近 8 週各星期幾的平均營收推估" + (" (已含本次輸入的營收)。" if entered_rev is not None else "。"))
 
         submit_clicked = False
         confirm_overwrite = False
@@ -514,22 +415,43 @@ if login_ui(user_df):
                 int(cash), int(card), int(remit), 
                 int(deposit), int(forfeit), 
                 int(cash_coupon), rev_memo,
-                int(total_rev), int(current_month_rev), f"{target_ratio*100:.1f}%", 
+                int(total_rev), int(current_month_rev), encode_ratio(target_ratio), 
                 int(customers), int(avg_customer_spend),
                 float(k_hours), float(f_hours), float(total_hrs), 
-                int(avg_rate), int(productivity), f"{labor_ratio*100:.1f}%",
+                int(avg_rate), int(productivity), encode_ratio(labor_ratio),
                 int(petty_yesterday), int(petty_expense), int(petty_replenish), int(petty_today),
                 int(ikkon_coupon), int(thousand_coupon), int(total_coupon),
                 emp_user_str, emp_target_str, 
                 ops_note.strip(), tags_str, reason_action.strip(), announcement.strip() 
             ]
             
-            success, action = db.upsert_report("Sheet1", str(date), department, new_row)
+            # 以同部門同星期幾的近期基準比對，只查詢記憶體中的索引，不增加 API 讀取
+            detector = get_anomaly_detector()
+            today_values = {'總營業額': total_rev, '工時產值': productivity, '人事成本占比': labor_ratio}
+            alert_lines = [format_alert(a) for a in detector.check(department, date, today_values)]
+            
+            week_index = get_week_index()
+            projection_engine = get_projection_engine()
+            # 寫入成功後資料服務會直接把這筆日報套入快取，各索引則在下方增量更新，不需重新讀取整張表
+            success, action = service.upsert_report("Sheet1", str(date), department, new_row)
             
             if success:
                 action_text = "更新" if action == "updated" else "新增"
                 st.success(f"營運報表已成功{action_text}。")
-                st.cache_data.clear()
+                week_index.upsert_day(
+                    department, date, total_rev, customers, total_hrs, total_hrs * avg_rate
+                )
+                detector.update(department, date, today_values)
+                projection_engine.update(department, date, total_rev)
+                food_cost_index = peek_food_cost_index()
+                if food_cost_index is not None:
+                    food_cost_index.set_revenue(department, date, total_rev)
+                search_index = peek_search_index()
+                if search_index is not None:
+                    search_index.upsert_daily(date, department, tags_str, dict(zip(DAILY_FIELDS, [ops_note, reason_action, announcement])))
+                
+                if alert_lines:
+                    st.warning("⚠️ **本日數據與近期同星期表現差異較大，請確認是否輸入正確或回報原因：**\n\n" + "\n".join(f"- {line}" for line in alert_lines))
                 
                 # 提交成功後，將暫存的文字清除，維持下一次填寫時畫面乾淨
                 for k in ["daily_rev_memo", "daily_ops_note", "daily_announcement", "daily_reason_action"]:
@@ -547,7 +469,7 @@ if login_ui(user_df):
                 
                 ops_img_bytes = generate_ops_image(
                     date, department, productivity, labor_ratio, k_hours, f_hours, 
-                    ops_note, announcement, tags_str, reason_action
+                    ops_note, announcement, tags_str, reason_action, alert_lines
                 )
                 
                 st.divider()
@@ -566,6 +488,7 @@ if login_ui(user_df):
                 st.error(f"報表寫入失敗，請聯絡系統管理員。錯誤訊息：{action}")
 
     elif mode == "值班主管週報":
+        import altair as alt
         st.title("值班主管週報")
         
         now = datetime.datetime.now()
@@ -591,34 +514,45 @@ if login_ui(user_df):
         
         st.success(f"目前統計區間：`{start_of_week}` 至 `{end_of_week}`")
         
-        week_rev, week_spend, week_prod = 0, 0, 0
-        if report_data:
-            df = pd.DataFrame(report_data)
-            if not df.empty and '日期' in df.columns:
-                df['日期'] = pd.to_datetime(df['日期'])
-                mask = (df['部門'] == department) & (df['日期'].dt.date >= start_of_week) & (df['日期'].dt.date <= end_of_week)
-                week_df = df.loc[mask].copy()
-                
-                if not week_df.empty:
-                    for col in ['總營業額', '總來客數', '總工時']:
-                        week_df[col] = pd.to_numeric(week_df[col], errors='coerce').fillna(0)
-                    
-                    week_rev = week_df['總營業額'].sum()
-                    week_cust = week_df['總來客數'].sum()
-                    week_hrs = week_df['總工時'].sum()
-                    
-                    week_spend = week_rev / week_cust if week_cust > 0 else 0
-                    week_prod = week_rev / week_hrs if week_hrs > 0 else 0
-                else:
-                    st.warning("⚠️ 系統尚未抓取到此區間的任何日報資料。")
+        week_index = get_week_index()
+        week_metrics = week_index.week(department, selected_date)
+        week_rev = week_metrics['總營業額']
+        week_spend = week_metrics['客單價']
+        week_prod = week_metrics['工時產值']
+        if week_metrics['營業天數'] == 0:
+            st.warning("⚠️ 系統尚未抓取到此區間的任何日報資料。")
+        
+        trend_df = week_index.trend(department, selected_date, weeks=12)
+        prev_week = trend_df.iloc[-2]
+        
+        def wow_delta(col):
+            value = trend_df.iloc[-1][f'{col}週增減']
+            return f"{value*100:+.1f}% vs 上週" if pd.notna(value) else None
         
         c1, c2, c3 = st.columns(3)
         with c1:
-            st.metric("本週累計總營收", f"${week_rev:,.0f}")
+            st.metric("本週累計總營收", f"${week_rev:,.0f}", delta=wow_delta('總營業額'))
         with c2:
-            st.metric("本週平均客單價", f"${week_spend:,.0f}")
+            st.metric("本週平均客單價", f"${week_spend:,.0f}", delta=wow_delta('客單價'))
         with c3:
-            st.metric("本週平均工時產值", f"${week_prod:,.0f}/hr")
+            st.metric("本週平均工時產值", f"${week_prod:,.0f}/hr", delta=wow_delta('工時產值'))
+        st.caption(f"上週營收 ${prev_week['總營業額']:,.0f}｜人事成本占比 本週 {week_metrics['人事成本占比']*100:.1f}% / 上週 {prev_week['人事成本占比']*100:.1f}%")
+        
+        with st.expander("近期週營收趨勢", expanded=False):
+            trend_weeks = st.slider("顯示週數", min_value=8, max_value=12, value=12)
+            trend_view = trend_df.tail(trend_weeks).copy()
+            trend_chart = alt.Chart(trend_view).mark_bar(color='#1E508C').encode(
+                x=alt.X('週別:N', title='ISO 週別', sort=None),
+                y=alt.Y('總營業額:Q', title='週營收 ($)'),
+                tooltip=['週別', '週起始日', '總營業額', '客單價', '工時產值']
+            ).properties(height=280)
+            st.altair_chart(trend_chart, use_container_width=True)
+            
+            trend_table = trend_view[['週別', '週起始日', '營業天數', '總營業額', '總營業額週增減', '客單價', '工時產值', '人事成本占比']].copy()
+            trend_table['週起始日'] = trend_table['週起始日'].astype(str)
+            trend_table['總營業額週增減'] = trend_table['總營業額週增減'].map(lambda v: f"{v*100:+.1f}%" if pd.notna(v) else "-")
+            trend_table['人事成本占比'] = trend_table['人事成本占比'].map(lambda v: f"{v*100:.1f}%")
+            st.dataframe(trend_table.iloc[::-1], use_container_width=True, hide_index=True)
 
         st.divider()
         st.subheader("營運深度分析 (請詳細論述)")
@@ -657,11 +591,13 @@ if login_ui(user_df):
                     st.session_state['user_name']
                 ]
                 
-                success, action = db.upsert_report("WeeklyReports", str(selected_date), department, new_weekly_row)
+                success, action = service.upsert_report("WeeklyReports", str(selected_date), department, new_weekly_row)
                 
                 if success:
                     st.success("週報已成功寫入核心資料庫！")
-                    st.cache_data.clear()
+                    search_index = peek_search_index()
+                    if search_index is not None:
+                        search_index.upsert_weekly(selected_date, department, st.session_state['user_name'], dict(zip(WEEKLY_FIELDS, new_weekly_row[7:11])))
                     
                     # 提交成功後，清除快取防止舊文章卡在輸入框內
                     for k in ["wk_review", "wk_hr", "wk_market", "wk_a1", "wk_a2", "wk_a3"]:
@@ -682,6 +618,7 @@ if login_ui(user_df):
                     st.error(f"寫入失敗：{action}")
 
     elif mode == "月度損益彙總":
+        import altair as alt
         st.title("月度財務彙總分析")
         
         if st.session_state['dept_access'] == "ALL":
@@ -689,9 +626,8 @@ if login_ui(user_df):
         else:
             view_mode = "綜合彙總"
             
-        raw_df = pd.DataFrame(report_data)
+        raw_df = service.report_frame()
         if not raw_df.empty:
-            raw_df['日期'] = pd.to_datetime(raw_df['日期'])
             if st.session_state['dept_access'] != "ALL":
                 raw_df = raw_df[raw_df['部門'] == st.session_state['dept_access']]
             
@@ -701,16 +637,10 @@ if login_ui(user_df):
             filtered_df = raw_df[raw_df['日期'].dt.strftime('%Y-%m') == target_month].copy()
             filtered_df = filtered_df.sort_values(by='日期')
             
-            for col in ['總營業額', '總工時', '平均時薪', '現金', '刷卡', '匯款', '工時產值', '客單價', '總來客數']:
-                filtered_df[col] = pd.to_numeric(filtered_df[col], errors='coerce').fillna(0)
-            
-            if '人事成本占比' in filtered_df.columns:
-                filtered_df['人事成本數值'] = filtered_df['人事成本占比'].astype(str).str.replace('%', '', regex=False)
-                filtered_df['人事成本數值'] = pd.to_numeric(filtered_df['人事成本數值'], errors='coerce').fillna(0)
-            
-            m_rev = filtered_df['總營業額'].sum()
-            m_hrs = filtered_df['總工時'].sum()
-            m_cost = (filtered_df['總工時'] * filtered_df['平均時薪']).sum()
+            month_kpi = kpi.month_summary(filtered_df, target_month, TARGETS)
+            m_rev = month_kpi['總營業額'].sum()
+            m_hrs = month_kpi['總工時'].sum()
+            m_cost = month_kpi['人事成本'].sum()
             
             st.divider()
             c1, c2, c3 = st.columns(3)
@@ -718,11 +648,26 @@ if login_ui(user_df):
             c2.metric("預估人事支出", f"${m_cost:,.0f}")
             c3.metric("平均工時產值", f"${m_rev/m_hrs:,.0f}/hr" if m_hrs > 0 else "0")
             
+            month_start = datetime.datetime.strptime(target_month, '%Y-%m').date()
+            month_end = month_start.replace(day=calendar.monthrange(month_start.year, month_start.month)[1])
+            as_of = min(datetime.date.today(), month_end)
+            if as_of >= month_start:
+                visible_targets = {d: t for d, t in TARGETS.items() if st.session_state['dept_access'] in ("ALL", d)}
+                projection_df = get_projection_engine().project_all(visible_targets, as_of)
+                if not projection_df.empty and projection_df['剩餘天數'].max() > 0:
+                    st.markdown(f"##### 月底營收預測 (基準日 {as_of})")
+                    projection_view = projection_df[['部門', '月累計營收', '預估月底營收', '月目標', '預估達成率', '達標所需日均', '輪廓日均']].copy()
+                    projection_view['預估達成率'] = projection_view['預估達成率'].map(lambda v: f"{v*100:.1f}%")
+                    st.dataframe(
+                        projection_view, use_container_width=True, hide_index=True,
+                        column_config={c: st.column_config.NumberColumn(format="$%d") for c in ['月累計營收', '預估月底營收', '月目標', '達標所需日均', '輪廓日均']}
+                    )
+            
             st.subheader("趨勢與結構分析")
             
             if st.session_state['dept_access'] == "ALL":
                 st.markdown("##### 各分店當月累計營收")
-                dept_totals = filtered_df.groupby('部門')['總營業額'].sum()
+                dept_totals = month_kpi.set_index('部門')['總營業額']
                 if not dept_totals.empty:
                     dept_cols = st.columns(len(dept_totals))
                     for idx, (dept_name, dept_total) in enumerate(dept_totals.items()):
@@ -736,6 +681,48 @@ if login_ui(user_df):
                         )
                     st.write("") 
 
+            st.markdown("##### 食材成本與人事成本")
+            st.caption("食材成本占比 = 叫貨系統登記的叫貨總價 ÷ 營業額；與人事成本占比合計即為主要成本率。")
+            visible_depts = None if st.session_state['dept_access'] == "ALL" else [st.session_state['dept_access']]
+            food_cost_index = get_food_cost_index()
+            month_food = food_cost_index.summary("month", month_start, month_end, visible_depts)
+            cost_view = month_kpi[['部門', '總營業額', '人事成本占比']].merge(
+                month_food[['部門', '叫貨成本', '食材成本占比']], on='部門', how='left'
+            ).fillna({'叫貨成本': 0.0, '食材成本占比': 0.0})
+            cost_view['主要成本率'] = cost_view['食材成本占比'] + cost_view['人事成本占比']
+            for col in ['人事成本占比', '食材成本占比', '主要成本率']:
+                cost_view[col] = cost_view[col].map(lambda v: f"{v*100:.1f}%")
+            st.dataframe(
+                cost_view[['部門', '總營業額', '叫貨成本', '食材成本占比', '人事成本占比', '主要成本率']],
+                use_container_width=True, hide_index=True,
+                column_config={c: st.column_config.NumberColumn(format="$%d") for c in ['總營業額', '叫貨成本']}
+            )
+            
+            with st.expander("食材成本明細 (日 / 週 / 廠商)"):
+                period_label = st.radio("彙總週期", list(PERIODS.keys()), horizontal=True, key="food_cost_period")
+                period_df = food_cost_index.summary(PERIODS[period_label], month_start, month_end, visible_depts)
+                if period_df.empty:
+                    st.info("此月份尚無叫貨或營收資料。")
+                else:
+                    period_chart = alt.Chart(period_df.assign(期間=period_df['期間'].dt.strftime('%m-%d'), 食材成本數值=period_df['食材成本占比'] * 100)).mark_line(point=True).encode(
+                        x=alt.X('期間:N', title='期間起始日'),
+                        y=alt.Y('食材成本數值:Q', title='食材成本佔比 (%)', scale=alt.Scale(zero=False)),
+                        color=alt.Color('部門:N', title='分店'),
+                        tooltip=['期間', '部門', '叫貨成本', '總營業額']
+                    ).properties(height=300)
+                    st.altair_chart(period_chart, use_container_width=True)
+                
+                vendor_df = food_cost_index.vendor_breakdown(month_start, month_end, visible_depts)
+                if not vendor_df.empty:
+                    st.markdown("**廠商叫貨結構**")
+                    vendor_view = vendor_df.copy()
+                    for col in ['占叫貨比', '占營收比']:
+                        vendor_view[col] = vendor_view[col].map(lambda v: f"{v*100:.1f}%")
+                    st.dataframe(
+                        vendor_view, use_container_width=True, hide_index=True,
+                        column_config={'叫貨成本': st.column_config.NumberColumn(format="$%d")}
+                    )
+            
             chart_df = filtered_df.copy()
             chart_df['日期標籤'] = chart_df['日期'].dt.strftime('%m-%d')
             
@@ -783,18 +770,7 @@ if login_ui(user_df):
                     ).properties(height=350)
                     st.altair_chart(line_chart_labor, use_container_width=True)
             else:
-                def aggregate_daily(df):
-                    res = pd.Series(dtype='float64')
-                    res['總營業額'] = df['總營業額'].sum()
-                    res['總來客數'] = df['總來客數'].sum()
-                    res['總工時'] = df['總工時'].sum()
-                    daily_cost = (df['總工時'] * df['平均時薪']).sum()
-                    res['客單價'] = res['總營業額'] / res['總來客數'] if res['總來客數'] > 0 else 0
-                    res['工時產值'] = res['總營業額'] / res['總工時'] if res['總工時'] > 0 else 0
-                    res['人事成本數值'] = (daily_cost / res['總營業額'] * 100) if res['總營業額'] > 0 else 0
-                    return res
-
-                agg_df = chart_df.groupby('日期標籤').apply(aggregate_daily).reset_index()
+                agg_df = kpi.rollup(chart_df, '日期標籤')
                 
                 with tab1:
                     st.caption("全品牌每日營收總和趨勢。")
@@ -836,5 +812,40 @@ if login_ui(user_df):
             st.subheader("當月明細數據")
             display_cols = ['日期', '部門', '現金', '刷卡', '匯款', '總營業額', '金額備註', '營運回報', '客訴分類標籤']
             st.dataframe(filtered_df[display_cols].sort_values(by='日期', ascending=False), use_container_width=True)
+            
+            with st.expander("匯出歷史報表 (CSV / Parquet / Excel)"):
+                export_ui("monthly_export", list(TARGETS.keys()) if st.session_state['dept_access'] == "ALL" else [st.session_state['dept_access']])
         else:
             st.info("尚未有數據。")
+
+    elif mode == "營運知識搜尋":
+        st.title("營運知識搜尋")
+        st.caption("搜尋歷年日報 (營運回報、客訴原因與處理結果、事項宣達) 與值班主管週報內容。多個關鍵字以空白分隔，需同時出現才會列出。")
+        
+        search_depts = list(TARGETS.keys()) if st.session_state['dept_access'] == "ALL" else [st.session_state['dept_access']]
+        query = st.text_input("關鍵字", placeholder="例：湯頭 上菜", key="search_query")
+        
+        f1, f2, f3, f4 = st.columns([2, 2, 2, 1])
+        with f1:
+            filter_depts = st.multiselect("分店", search_depts, default=search_depts, key="search_depts")
+        with f2:
+            today = datetime.date.today()
+            search_range = st.date_input("日期區間", (today - datetime.timedelta(days=365), today), key="search_range")
+        with f3:
+            filter_tags = st.multiselect("客訴分類 (僅日報)", COMPLAINT_TAGS, key="search_tags")
+        with f4:
+            filter_sources = st.multiselect("來源", ["日報", "週報"], default=["日報", "週報"], key="search_sources")
+        
+        with st.spinner("建立搜尋索引中..."):
+            search_index = get_search_index()
+        
+        if query.strip():
+            start, end = (search_range[0], search_range[1]) if len(search_range) == 2 else (None, None)
+            results = search_index.search(query, departments=filter_depts, start=start, end=end, tags=filter_tags, sources=filter_sources)
+            if results.empty:
+                st.info("找不到符合條件的紀錄，可嘗試減少關鍵字或放寬日期區間。")
+            else:
+                st.caption(f"共 {len(results)} 筆結果 (依符合次數與日期排序，最多顯示 200 筆)")
+                st.dataframe(results, use_container_width=True, hide_index=True)
+        else:
+            st.caption(f"目前索引共 {len(search_index):,} 段文字。")
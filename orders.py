@@ -0,0 +1,60 @@
+import pandas as pd
+
+# --- 叫貨單彙整：將當日 Procurement 明細依 (分店, 廠商) 合併成一張叫貨單 ---
+
+def build_vendor_orders(proc_df, date_str, departments=None):
+    # proc_df 為 schema.decode_procurement 型別化後的叫貨明細 (與食材成本分析相同的日期與金額解析)
+    if proc_df is None or proc_df.empty:
+        return []
+
+    day_df = proc_df[proc_df['日期'] == pd.Timestamp(date_str)]
+    if departments is not None:
+        day_df = day_df[day_df['部門'].isin(departments)]
+    if day_df.empty:
+        return []
+
+    day_df = day_df.copy()
+    # 無法解析的金額以 0 顯示 (食材成本同樣不計入)
+    for col in ['單價', '數量', '總價']:
+        day_df[col] = day_df[col].fillna(0)
+
+    # 同一廠商同一品項若分多次加入清單，合併為一行並加總數量與金額
+    item_df = day_df.groupby(['部門', '廠商', '品項'], sort=False).agg(
+        數量=('數量', 'sum'),
+        單價=('單價', 'last'),
+        總價=('總價', 'sum'),
+    ).reset_index()
+    orderer_df = day_df.groupby(['部門', '廠商'], sort=False)['叫貨人'].agg(
+        lambda s: "、".join(dict.fromkeys(str(v).strip() for v in s if str(v).strip()))
+    )
+
+    orders = []
+    for (dept, vendor), group in item_df.groupby(['部門', '廠商'], sort=True):
+        items = tuple(
+            (name, float(qty), float(price), float(total))
+            for name, qty, price, total in zip(group['品項'], group['數量'], group['單價'], group['總價'])
+        )
+        orders.append({
+            "部門": dept,
+            "廠商": vendor,
+            "品項": items,
+            "總價": float(group['總價'].sum()),
+            "叫貨人": orderer_df.get((dept, vendor), "") or "無",
+        })
+    return orders
+
+def format_order_text(date_str, order):
+    lines = [
+        f"【IKKON 叫貨單】{date_str}",
+        f"分店：{order['部門']}",
+        f"廠商：{order['廠商']}",
+        "",
+    ]
+    for idx, (item_name, quantity, unit_price, line_total) in enumerate(order['品項'], start=1):
+        lines.append(f"{idx}. {item_name} × {quantity:g}")
+    lines.extend([
+        "",
+        f"共 {len(order['品項'])} 項，麻煩協助配送，謝謝！",
+        f"叫貨人：{order['叫貨人']}",
+    ])
+    return "\n".join(lines)
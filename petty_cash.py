@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+# --- 零用金對帳：一次檢查所有部門全部歷史的零用金鏈 ---
+# 每日「昨日剩」應等於同部門前一筆日報的「今日剰」，且 昨日剩 - 今日支出 + 今日補 = 今日剰
+
+PETTY_COLUMNS = ['昨日剩', '今日支出', '今日補', '今日剰']
+ISSUE_TYPES = {
+    'break': "鏈結中斷",
+    'gap': "日報缺日",
+    'mismatch': "金額不符",
+}
+RESULT_COLUMNS = ['部門', '日期', '問題類型', '說明', '前一筆日期', '前日今日剰', '昨日剩', '今日支出', '今日補', '今日剰', '差額']
+
+def reconcile(report_df, tolerance=0):
+    # report_df 為 kpi.prepare_reports 型別化後的資料；回傳所有問題列，依部門、日期排序
+    if report_df is None or report_df.empty or not set(PETTY_COLUMNS).issubset(report_df.columns):
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    df = report_df[['部門', '日期'] + PETTY_COLUMNS].dropna(subset=['日期'])
+    df = df.sort_values(['部門', '日期'], kind='mergesort').reset_index(drop=True)
+
+    dept = df['部門'].to_numpy()
+    dates = df['日期'].to_numpy()
+    y, e, r, t = (df[c].to_numpy(dtype=float) for c in PETTY_COLUMNS)
+
+    # 排序後以前一列作為「前一筆日報」，部門交界處不比對
+    has_prev = np.r_[False, dept[1:] == dept[:-1]]
+    prev_t = np.r_[np.nan, t[:-1]]
+    prev_date = np.r_[np.datetime64('NaT'), dates[:-1]].astype(dates.dtype)
+    gap_days = (dates - prev_date) / np.timedelta64(1, 'D')
+
+    chain_diff = y - prev_t
+    calc_diff = t - (y - e + r)
+    is_break = has_prev & ~np.isnan(chain_diff) & (np.abs(chain_diff) > tolerance)
+    is_gap = has_prev & (gap_days > 1)
+    is_mismatch = ~np.isnan(calc_diff) & (np.abs(calc_diff) > tolerance)
+
+    frames = []
+    for kind, mask, diff in [('break', is_break, chain_diff), ('gap', is_gap, np.full(len(df), np.nan)), ('mismatch', is_mismatch, calc_diff)]:
+        if not mask.any():
+            continue
+        issue = df.loc[mask, ['部門', '日期'] + PETTY_COLUMNS].copy()
+        issue['問題類型'] = ISSUE_TYPES[kind]
+        issue['前一筆日期'] = prev_date[mask]
+        issue['前日今日剰'] = prev_t[mask]
+        issue['差額'] = diff[mask]
+        if kind == 'break':
+            issue['說明'] = "昨日剩與前一筆今日剰不一致"
+        elif kind == 'gap':
+            issue['說明'] = [f"與前一筆日報相隔 {int(d) - 1} 天未回報" for d in gap_days[mask]]
+        else:
+            issue['說明'] = "昨日剩 - 今日支出 + 今日補 ≠ 今日剰"
+        frames.append(issue)
+
+    if not frames:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    result = pd.concat(frames, ignore_index=True)
+    return result.sort_values(['部門', '日期'], kind='mergesort')[RESULT_COLUMNS].reset_index(drop=True)
+
+def summarize(issues):
+    # 各部門各問題類型的筆數，供後台總覽
+    if issues.empty:
+        return pd.DataFrame(columns=['部門'] + list(ISSUE_TYPES.values()))
+    table = issues.pivot_table(index='部門', columns='問題類型', values='日期', aggfunc='count', fill_value=0)
+    return table.reindex(columns=list(ISSUE_TYPES.values()), fill_value=0).rename_axis(columns=None).reset_index()
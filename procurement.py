@@ -1,57 +1,36 @@
 import streamlit as st
 import datetime
-import pandas as pd
-from database import DatabaseManager
+from data_service import get_data_service
+import scheduler
+from auth import login_ui, logout
+from orders import build_vendor_orders, format_order_text
+from report_images import generate_order_image
 
 st.set_page_config(page_title="IKKON 採購與叫貨系統", layout="wide")
 
-# 這裡共用你原本的 Google Sheets ID 與 DatabaseManager
-SID = "16FcpJZLhZjiRreongRDbsKsAROfd5xxqQqQMfAI7H08"
-db = DatabaseManager(SID, st.secrets)
+# 與營運系統使用同一套資料服務 (同一份試算表，寫入後以時間戳記檔通知對方重新讀取)
+# 叫貨系統為獨立程序，配額桶無法與營運系統共用，改用自己的 Sheets API 配額份額，兩者合計不超過服務帳號上限
+scheduler.configure("procurement")
+service = get_data_service(st.secrets)
 
-@st.cache_data(ttl=300)
-def load_procurement_data():
-    if not db.client: return None, None
-    try:
-        sh = db.client.open_by_key(SID)
-        user_df = pd.DataFrame(sh.worksheet("Users").get_all_records())
-        # 假設你有一個 Vendors 工作表來管理廠商與預設品項，初期也可先用手動輸入
-        # vendor_df = pd.DataFrame(sh.worksheet("Vendors").get_all_records())
-        return user_df, None
-    except Exception as e:
-        st.error(f"資料讀取錯誤：{e}")
-        return None, None
+user_df = service.users()
+if user_df is None:
+    st.error("資料讀取錯誤：無法取得帳號資料，請稍後再試。")
+# 假設你有一個 Vendors 工作表來管理廠商與預設品項，初期也可先用手動輸入
+# vendor_df = service.db.get_sheet_records("Vendors")
 
-user_df, vendor_df = load_procurement_data()
+# 以品項明細作為快取鍵：該廠商的叫貨內容未變動前，文字與圖片都直接沿用
+@st.cache_data(max_entries=500, show_spinner=False)
+def render_vendor_order(date_str, order):
+    text = format_order_text(date_str, order)
+    img_bytes = generate_order_image(date_str, order['部門'], order['廠商'], order['品項'], order['總價'], order['叫貨人'])
+    return text, img_bytes
 
-# 簡化的登入邏輯 (共用原本的 Users 資料表)
-def login_ui():
-    if st.session_state.get("logged_in"): return True
-    st.title("IKKON 內場叫貨系統登入")
-    with st.form("login_form"):
-        input_user = st.text_input("帳號名稱")
-        input_pwd = st.text_input("密碼", type="password")
-        if st.form_submit_button("登入"):
-            if user_df is not None and not user_df.empty:
-                user_df['密碼'] = user_df['密碼'].astype(str)
-                match = user_df[(user_df['帳號名稱'] == input_user) & (user_df['密碼'] == input_pwd)]
-                if not match.empty:
-                    user_info = match.iloc[0]
-                    st.session_state.update({
-                        "logged_in": True, 
-                        "user_name": user_info['帳號名稱'], 
-                        "dept_access": user_info['負責部門']
-                    })
-                    st.rerun()
-            st.error("帳號或密碼錯誤")
-    return False
-
-if login_ui():
+if login_ui(user_df, "IKKON 內場叫貨系統登入", on_refresh=lambda: service.invalidate("users")):
     with st.sidebar:
         st.title(f"叫貨人：{st.session_state['user_name']}")
         if st.button("安全登出"):
-            st.session_state.clear()
-            st.rerun()
+            logout()
 
     st.title("建立採購叫貨單")
     
@@ -84,18 +63,45 @@ if login_ui():
                 unit_price, quantity, total_cost, st.session_state['user_name'], "已叫貨"
             ]
             
-            # 使用我們強大的 DatabaseManager 寫入新的 Procurement 工作表
-            try:
-                sh = db.client.open_by_key(SID)
-                sheet = sh.worksheet("Procurement")
-                sheet.append_row(new_order)
+            # 寫入 Procurement 工作表；資料服務直接把這筆叫貨接到快取，營運系統的報表快取不受影響
+            success, msg = service.append_procurement(new_order)
+            if success:
                 st.success(f"{item_name} 已成功加入叫貨清單！")
-                st.cache_data.clear()
-            except Exception as e:
-                st.error(f"寫入失敗：{e}")
+                # 同一程序內若已建立食材成本索引，直接累加這筆叫貨金額，不重建索引
+                food_cost_index = service.peek("food_cost", sources=("reports", "procurement"))
+                if food_cost_index is not None:
+                    food_cost_index.add_purchase(department, date, vendor, total_cost)
+            else:
+                st.error(f"寫入失敗：{msg}")
         else:
             st.warning("請填寫完整的廠商、品項與數量。")
 
     st.divider()
     st.markdown("### 叫貨單預覽與發送")
-    st.caption("未來可在此處新增一鍵複製文字或自動發送 Line 給廠商的功能，提升內場工作效率。")
+    st.caption("系統已依分店與廠商自動彙整當日叫貨明細，可直接複製文字或長按圖片傳送給廠商。")
+
+    proc_df = service.procurement_frame() if service.procurement() is not None else None
+    order_depts = None if dept == "ALL" else [department]
+    orders = build_vendor_orders(proc_df, str(date), order_depts)
+
+    if proc_df is None:
+        st.error("叫貨資料讀取失敗，請稍後再試。")
+    elif not orders:
+        st.info(f"{date} 尚未有任何叫貨紀錄。")
+    else:
+        st.caption(f"{date} 共 {len(orders)} 張叫貨單，預估總金額 ${sum(o['總價'] for o in orders):,.0f}")
+        for order in orders:
+            text, img_bytes = render_vendor_order(str(date), order)
+            with st.expander(f"{order['部門']}｜{order['廠商']}（{len(order['品項'])} 項，${order['總價']:,.0f}）"):
+                o1, o2 = st.columns(2)
+                with o1:
+                    st.markdown("**文字訊息 (點右上角即可複製)**")
+                    st.code(text, language=None)
+                with o2:
+                    st.markdown("**叫貨單圖片**")
+                    st.image(img_bytes, use_container_width=True)
+                    st.download_button(
+                        "下載叫貨單圖片", img_bytes,
+                        file_name=f"{date}_{order['部門']}_{order['廠商']}.jpg",
+                        mime="image/jpeg", key=f"dl_{order['部門']}_{order['廠商']}"
+                    )
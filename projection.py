@@ -0,0 +1,126 @@
+import bisect
+import calendar
+import datetime
+import threading
+import pandas as pd
+
+# --- 月底營收預測：以各部門近期「星期幾」營收輪廓推估剩餘天數，並換算達標所需日均 ---
+
+PROFILE_DAYS = 56  # 營收輪廓取各部門最近 8 週資料
+
+class ProjectionEngine:
+    def __init__(self, profile_days=PROFILE_DAYS):
+        self.profile_days = profile_days
+        self._lock = threading.Lock()
+        self._days = {}        # (部門, 日期) -> 營收
+        self._months = {}      # (部門, 年, 月) -> 當月累計營收
+        self._window = {}      # (部門, 星期幾) -> 輪廓視窗內已排序的日期清單
+        self._profile = {}     # (部門, 星期幾) -> [營收合計, 天數]
+        self._latest = {}      # 部門 -> 最新一筆日報日期
+        self._cache = {}       # (部門, 基準日, 目標, 當日營收) -> 預測結果
+
+    @classmethod
+    def from_frame(cls, report_df, **kwargs):
+        engine = cls(**kwargs)
+        if report_df is None or report_df.empty:
+            return engine
+
+        day_df = report_df.groupby(['部門', report_df['日期'].dt.normalize()])['總營業額'].sum().reset_index()
+        day_df['總營業額'] = day_df['總營業額'].fillna(0)
+        dates = day_df['日期'].dt.date
+        engine._days = dict(zip(zip(day_df['部門'], dates), day_df['總營業額'].astype(float)))
+
+        month_df = day_df.groupby(['部門', day_df['日期'].dt.year, day_df['日期'].dt.month])['總營業額'].sum()
+        engine._months = {key: float(v) for key, v in month_df.items()}
+
+        # 每個部門以自己的最新日期往回取輪廓視窗，一次以 groupby 算出所有 (部門, 星期幾) 的合計
+        latest = day_df.groupby('部門')['日期'].transform('max')
+        window_df = day_df[day_df['日期'] > latest - pd.Timedelta(days=engine.profile_days)].copy()
+        window_df['星期'] = window_df['日期'].dt.weekday
+        profile = window_df.groupby(['部門', '星期'])['總營業額'].agg(['sum', 'count'])
+        engine._profile = {key: [float(row['sum']), int(row['count'])] for key, row in profile.iterrows()}
+        for dept, day in zip(window_df['部門'], window_df['日期'].dt.date):
+            engine._window.setdefault((dept, day.weekday()), []).append(day)
+        for window in engine._window.values():
+            window.sort()
+        engine._latest = {dept: d.date() for dept, d in day_df.groupby('部門')['日期'].max().items()}
+        return engine
+
+    def update(self, dept, day, revenue):
+        revenue = float(revenue)
+        with self._lock:
+            old = self._days.get((dept, day))
+            self._days[(dept, day)] = revenue
+            month_key = (dept, day.year, day.month)
+            self._months[month_key] = self._months.get(month_key, 0.0) - (old or 0.0) + revenue
+
+            latest = max(self._latest.get(dept, day), day)
+            self._latest[dept] = latest
+            cutoff = latest - datetime.timedelta(days=self.profile_days)
+            if day > cutoff:
+                key = (dept, day.weekday())
+                window = self._window.setdefault(key, [])
+                bucket = self._profile.setdefault(key, [0.0, 0])
+                if old is not None and day in window:
+                    bucket[0] -= old
+                else:
+                    bisect.insort(window, day)
+                    bucket[1] += 1
+                bucket[0] += revenue
+            # 最新日期往後推進時，將各星期已超出視窗的舊資料移出
+            for weekday in range(7):
+                key = (dept, weekday)
+                window = self._window.get(key)
+                while window and window[0] <= cutoff:
+                    expired = window.pop(0)
+                    self._profile[key][0] -= self._days.get((dept, expired), 0.0)
+                    self._profile[key][1] -= 1
+            self._cache = {k: v for k, v in self._cache.items() if k[0] != dept}
+
+    def weekday_profile(self, dept):
+        with self._lock:
+            buckets = {wd: self._profile.get((dept, wd), [0.0, 0]) for wd in range(7)}
+        # 近 8 週某個星期幾都沒有日報 (通常是公休日) 時視為 0 營收，不以整體日均補上
+        return {wd: (b[0] / b[1] if b[1] else 0.0) for wd, b in buckets.items()}
+
+    def project(self, dept, as_of, target, today_revenue=None):
+        cache_key = (dept, as_of, float(target or 0), today_revenue)
+        with self._lock:
+            cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        days_in_month = calendar.monthrange(as_of.year, as_of.month)[1]
+        later = [as_of.replace(day=d) for d in range(as_of.day + 1, days_in_month + 1)]
+        with self._lock:
+            # 月累計只計到基準日 (基準日在過去時扣除之後已入帳的日報)
+            month_actual = self._months.get((dept, as_of.year, as_of.month), 0.0)
+            month_actual -= sum(self._days.get((dept, d), 0.0) for d in later)
+            has_report = (dept, as_of) in self._days
+            if today_revenue is not None:
+                month_actual += float(today_revenue) - self._days.get((dept, as_of), 0.0)
+        profile = self.weekday_profile(dept)
+
+        # 基準日尚無日報 (也沒有本次輸入的營收) 時，基準日本身也以輪廓推估
+        remaining = later if has_report or today_revenue is not None else [as_of] + later
+        projected = month_actual + sum(profile[d.weekday()] for d in remaining)
+        gap = max(float(target or 0) - month_actual, 0.0)
+
+        result = {
+            '部門': dept,
+            '基準日': as_of,
+            '月累計營收': month_actual,
+            '預估月底營收': projected,
+            '月目標': float(target or 0),
+            '預估達成率': projected / target if target else 0.0,
+            '剩餘天數': len(remaining),
+            '達標所需日均': gap / len(remaining) if remaining else 0.0,
+            '輪廓日均': sum(profile[d.weekday()] for d in remaining) / len(remaining) if remaining else 0.0,
+        }
+        with self._lock:
+            self._cache[cache_key] = result
+        return result
+
+    def project_all(self, targets, as_of):
+        # 一次計算所有部門，供月度彙總頁與批次使用
+        return pd.DataFrame([self.project(dept, as_of, target) for dept, target in targets.items()])
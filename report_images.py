@@ -0,0 +1,171 @@
+import streamlit as st
+import os
+import io
+import urllib.request
+
+# --- 圖片生成引擎與排版邏輯 (營運系統與叫貨系統共用) ---
+# PIL 只在實際產生圖片 (提交報表、叫貨單) 時才載入，登入與儀表板頁面不需要
+@st.cache_resource
+def get_chinese_font():
+    from PIL import ImageFont
+    font_path = "NotoSansCJKtc-Regular.otf"
+    if not os.path.exists(font_path):
+        try:
+            url = "https://raw.githubusercontent.com/googlefonts/noto-cjk/main/Sans/OTF/TraditionalChinese/NotoSansCJKtc-Regular.otf"
+            urllib.request.urlretrieve(url, font_path)
+        except Exception as e:
+            return None
+    try:
+        return ImageFont.truetype(font_path, 28)
+    except:
+        return None
+
+def get_wrapped_lines(text, max_chars=21):
+    if not text:
+        return ["無"]
+    lines = []
+    for paragraph in text.split('\n'):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            lines.append("")
+            continue
+        while len(paragraph) > max_chars:
+            lines.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if paragraph:
+            lines.append(paragraph)
+    if not lines:
+        return ["無"]
+    return lines
+
+def render_image(content_lines, theme_color=(180, 50, 50)):
+    from PIL import Image, ImageDraw, ImageFont
+
+    font = get_chinese_font()
+    if font is None:
+        font = ImageFont.load_default()
+
+    img_height = len(content_lines) * 45 + 80
+    img = Image.new('RGB', (650, img_height), color=(250, 250, 250))
+    draw = ImageDraw.Draw(img)
+
+    y_text = 40
+    for line in content_lines:
+        if "【" in line or "[" in line:
+            draw.text((40, y_text), line, font=font, fill=theme_color)
+        else:
+            draw.text((40, y_text), line, font=font, fill=(40, 40, 40))
+        y_text += 45
+
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=95)
+    return buf.getvalue()
+
+def generate_finance_image(date, dept, month_rev, month_cust, month_spend, ratio,
+                           today_rev, today_cust, today_spend,
+                           cash, card, remit, deposit, forfeit, cash_coupon,
+                           petty_y, petty_e, petty_r, petty_t, ikkon_cp, th_cp, tot_cp, emp_display_str):
+    lines = [
+        "【 IKKON 財務日報 】",
+        f"日期：{date} | 分店：{dept}",
+        "--------------------------------------",
+        "[ 營收指標 ]",
+        f"總營業額：${month_rev:,.0f} | 總來客數：{int(month_cust)} 人",
+        f"平均客單價：${month_spend:,.0f}",
+        f"目標占比：{ratio*100:.1f}%",
+        "",
+        f"今日營收：${today_rev:,.0f} | 今日來客數：{int(today_cust)} 人",
+        f"今日客單價：${today_spend:,.0f}",
+        "",
+        "[ 支付結構 ]",
+        f"現金：${cash:,.0f} | 刷卡：${card:,.0f}",
+        f"匯款：${remit:,.0f} | 訂金：${deposit:,.0f}",
+        f"沒收：${forfeit:,.0f} | 現金券：${cash_coupon:,.0f}",
+        "",
+        "[ 零用金結算 ]",
+        f"昨日剩餘：${petty_y:,.0f} | 今日支出：${petty_e:,.0f}",
+        f"今日補充：${petty_r:,.0f} | 今日剰餘：${petty_t:,.0f}",
+        "",
+        "[ 行銷與折扣 ]",
+        f"IKKON券：${ikkon_cp:,.0f} | 1000折價：${th_cp:,.0f}",
+        f"總折抵金：${tot_cp:,.0f}",
+    ]
+    lines.extend(get_wrapped_lines(f"員工85折：{emp_display_str}"))
+    return render_image(lines)
+
+def generate_ops_image(date, dept, prod, labor, k_hours, f_hours, ops_note, announce, tags_str, reason_action, alert_lines=None):
+    lines = [
+        "【 IKKON 營運日報 】",
+        f"日期：{date} | 分店：{dept}",
+        "--------------------------------------",
+        "[ 營運指標 ]",
+        f"工時產值：${prod:,.0f}/hr | 人事占比：{labor*100:.1f}%",
+        f"內場工時：{k_hours} hr | 外場工時：{f_hours} hr",
+        "",
+    ]
+    if alert_lines:
+        lines.append("[ 數據異常提醒 ]")
+        for alert in alert_lines:
+            lines.extend(get_wrapped_lines(f"- {alert}"))
+        lines.append("")
+    lines.append("[ 營運狀況回報 ]")
+    lines.extend(get_wrapped_lines(ops_note))
+    lines.extend(["", "[ 事項宣達 ]"])
+    lines.extend(get_wrapped_lines(announce))
+    lines.extend(["", f"[ 客訴處理 ({tags_str}) ]"])
+    lines.extend(get_wrapped_lines(reason_action))
+
+    return render_image(lines)
+
+def generate_weekly_image(date, dept, start_d, end_d, rev, spend, prod, review, hr_status, market, act1, act2, act3, author):
+    lines = [
+        "【 IKKON 值班主管週報 】",
+        f"回報日：{date} | 分店：{dept}",
+        f"統計區間：{start_d} 至 {end_d}",
+        "--------------------------------------",
+        "[ 本週核心數據 ]",
+        f"本週總營收：${rev:,.0f}",
+        f"平均客單價：${spend:,.0f} | 平均工時產值：${prod:,.0f}/hr",
+        "",
+        "[ 數據與營運檢討 ]"
+    ]
+    lines.extend(get_wrapped_lines(review))
+    lines.extend(["", "[ 團隊與人事狀況 ]"])
+    lines.extend(get_wrapped_lines(hr_status))
+    lines.extend(["", "[ 行銷觀察與改善建議 ]"])
+    lines.extend(get_wrapped_lines(market))
+    lines.extend(["", "[ 下週行動方針 ]"])
+
+    def append_action(prefix_num, text):
+        w_lines = get_wrapped_lines(text, max_chars=18)
+        lines.append(f"{prefix_num}. {w_lines[0]}")
+        for wl in w_lines[1:]:
+            lines.append(f"   {wl}")
+
+    append_action(1, act1)
+    append_action(2, act2)
+    append_action(3, act3)
+
+    lines.extend(["", "--------------------------------------", f"填寫人：{author}"])
+    return render_image(lines, theme_color=(30, 80, 140))
+
+def generate_order_image(date, dept, vendor, items, total_cost, orderer_str):
+    lines = [
+        "【 IKKON 叫貨單 】",
+        f"日期：{date} | 分店：{dept}",
+        f"廠商：{vendor}",
+        "--------------------------------------",
+        "[ 叫貨明細 ]"
+    ]
+    for idx, (item_name, quantity, unit_price, line_total) in enumerate(items, start=1):
+        w_lines = get_wrapped_lines(item_name, max_chars=14)
+        lines.append(f"{idx}. {w_lines[0]} × {quantity:g}")
+        for wl in w_lines[1:]:
+            lines.append(f"   {wl}")
+    lines.extend([
+        "",
+        "--------------------------------------",
+        f"品項數：{len(items)} | 預估總價：${total_cost:,.0f}",
+    ])
+    lines.extend(get_wrapped_lines(f"叫貨人：{orderer_str}"))
+    return render_image(lines, theme_color=(40, 120, 70))
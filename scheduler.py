@@ -0,0 +1,138 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from singleflight import SingleFlight
+
+# --- Google Sheets API 請求排程：同一程序內所有 DatabaseManager 呼叫共用同一個配額桶 ---
+# Sheets API 對同一個服務帳號的限制約為每分鐘 60 次請求，超過就會回傳 429 導致「資料讀取錯誤」
+# 營運系統、叫貨系統與批次 / 命令列工具是各自獨立的程序，配額桶無法跨程序共用，因此把服務帳號的上限分給各程序，
+# 合計不超過上限；可用環境變數 IKKON_SHEETS_QUOTA_<APP> (例如 IKKON_SHEETS_QUOTA_MAIN) 調整
+
+SHEETS_QUOTA_PER_MINUTE = 60
+APP_QUOTAS = {
+    "main": 40,         # 營運系統 (main.py)
+    "procurement": 10,  # 叫貨系統 (procurement.py)
+    "tools": 10,        # 批次與命令列工具 (batch.py、schema.py)；未呼叫 configure 的程序一律使用此份額
+}
+PRIORITY_WRITE = 0   # 日報、週報、叫貨等寫入優先
+PRIORITY_READ = 1    # 儀表板讀取排在寫入之後
+ACQUIRE_TIMEOUT = 45  # 秒；排隊超過此時間直接回報忙碌，避免畫面無限等待
+
+class SchedulerTimeout(Exception):
+    pass
+
+class RequestScheduler:
+    def __init__(self, quota_per_minute=SHEETS_QUOTA_PER_MINUTE, burst=None):
+        self.quota_per_minute = quota_per_minute
+        self.capacity = float(burst or quota_per_minute)
+        self.rate = quota_per_minute / 60.0
+        self._cond = threading.Condition()
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._inflight = SingleFlight()
+        self._usage = deque()  # (時間, 花費) 近 60 秒內實際送出的請求
+        self._stats = {"reads": 0, "writes": 0, "coalesced": 0, "throttled": 0, "timeouts": 0, "max_wait": 0.0}
+
+    def set_quota(self, quota_per_minute):
+        with self._cond:
+            self.quota_per_minute = quota_per_minute
+            self.capacity = float(quota_per_minute)
+            self.rate = quota_per_minute / 60.0
+            self._tokens = min(self._tokens, self.capacity)
+            self._cond.notify_all()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _acquire(self, priority, cost):
+        cost = min(float(cost), self.capacity)
+        start = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            waited = False
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._waiters[0] == ticket and self._tokens >= cost:
+                    heapq.heappop(self._waiters)
+                    self._tokens -= cost
+                    self._usage.append((now, cost))
+                    self._stats["throttled"] += int(waited)
+                    self._stats["max_wait"] = max(self._stats["max_wait"], now - start)
+                    self._cond.notify_all()
+                    return
+                if now - start > ACQUIRE_TIMEOUT:
+                    self._waiters.remove(ticket)
+                    heapq.heapify(self._waiters)
+                    self._stats["timeouts"] += 1
+                    self._cond.notify_all()
+                    raise SchedulerTimeout("Google Sheets 請求配額已滿，請稍後再試")
+                waited = True
+                # 排在最前面者等到配額補足即可；其他人等待前一位放行時被喚醒
+                timeout = (cost - self._tokens) / self.rate if self._waiters[0] == ticket else 1.0
+                self._cond.wait(timeout=max(timeout, 0.01))
+
+    def read(self, key, fn, cost=1):
+        # 相同 key 的讀取若已在進行中，直接共用結果，不再佔用配額
+        def run():
+            self._acquire(PRIORITY_READ, cost)
+            with self._cond:
+                self._stats["reads"] += 1
+            return fn()
+
+        leader = []
+        def tracked():
+            leader.append(True)
+            return run()
+        result = self._inflight.do(key, tracked)
+        if not leader:
+            with self._cond:
+                self._stats["coalesced"] += 1
+        return result
+
+    def write(self, fn, cost=1):
+        self._acquire(PRIORITY_WRITE, cost)
+        with self._cond:
+            self._stats["writes"] += 1
+        return fn()
+
+    def charge(self, cost=1, priority=PRIORITY_WRITE):
+        # 流程中逐一送出的 API 請求 (例如寫入流程的每次讀寫、重試) 各自取得配額，不另計一次操作
+        self._acquire(priority, cost)
+
+    def usage(self):
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            while self._usage and now - self._usage[0][0] > 60:
+                self._usage.popleft()
+            waiting = [p for p, _ in self._waiters]
+            return {
+                "quota_per_minute": self.quota_per_minute,
+                "used_last_minute": sum(c for _, c in self._usage),
+                "tokens_available": self._tokens,
+                "waiting_writes": waiting.count(PRIORITY_WRITE),
+                "waiting_reads": waiting.count(PRIORITY_READ),
+                "in_flight_reads": self._inflight.in_flight(),
+                **self._stats,
+            }
+
+# 程序內唯一的排程器：所有 session、所有 DatabaseManager 實例共用
+_scheduler = RequestScheduler(APP_QUOTAS["tools"])
+
+def get_scheduler():
+    return _scheduler
+
+def configure(app):
+    # 網頁程序啟動時指定自己的配額份額；重複呼叫 (Streamlit 每次重跑) 不影響排隊中的請求
+    quota = int(os.environ.get(f"IKKON_SHEETS_QUOTA_{app.upper()}", APP_QUOTAS[app]))
+    if quota != _scheduler.quota_per_minute:
+        _scheduler.set_quota(quota)
+    return _scheduler
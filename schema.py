@@ -0,0 +1,196 @@
+import argparse
+import sys
+import pandas as pd
+from database import VERSION_COLUMNS, PROCUREMENT_COLUMNS, ROW_FIELD, col_letter
+
+# --- Sheet1 儲存格式：每個欄位宣告型別，載入時一次完成型別轉換並回報異常值 ---
+# 型別：date 日期 / str 短文字 / int 整數金額 / float 工時 / ratio 比例 (儲存為 0.123，不再存 "12.3%") / text 長文字
+
+SCHEMA_VERSION = 2
+
+SHEET_SCHEMA = [
+    ("日期", "date"), ("部門", "str"),
+    ("現金", "int"), ("刷卡", "int"), ("匯款", "int"), ("訂金收入", "int"), ("沒收訂金", "int"), ("現金折價卷", "int"),
+    ("金額備註", "text"),
+    ("總營業額", "int"), ("月營業額", "int"), ("目標占比", "ratio"), ("總來客數", "int"), ("客單價", "int"),
+    ("內場工時", "float"), ("外場工時", "float"), ("總工時", "float"), ("平均時薪", "int"), ("工時產值", "int"), ("人事成本占比", "ratio"),
+    ("昨日剩", "int"), ("今日支出", "int"), ("今日補", "int"), ("今日剰", "int"),
+    ("IKKON折抵券", "int"), ("1000折價券", "int"), ("總共折抵金", "int"),
+    ("85折使用者", "text"), ("85折對象", "text"),
+    ("營運回報", "text"), ("客訴分類標籤", "text"), ("客訴原因與處理結果", "text"), ("事項宣達", "text"),
+]
+META_SCHEMA = [("版本", "int"), ("提交編號", "str")]
+
+SHEET_COLUMNS = [name for name, _ in SHEET_SCHEMA]
+COLUMN_TYPES = dict(SHEET_SCHEMA + META_SCHEMA)
+NUMERIC_COLUMNS = [name for name, dtype in SHEET_SCHEMA if dtype in ("int", "float", "ratio")]
+RATIO_COLUMNS = [name for name, dtype in SHEET_SCHEMA if dtype == "ratio"]
+
+ISSUE_COLUMNS = ['列號', '日期', '部門', '欄位', '原始值', '問題']
+
+def encode_ratio(value):
+    return round(float(value), 4)
+
+def _parse_ratio(raw):
+    # 相容舊資料："12.3%" 轉為 0.123；已是數值者維持原值
+    text = raw.astype(str).str.strip()
+    is_percent = text.str.endswith('%')
+    values = pd.to_numeric(text.str.rstrip('%'), errors='coerce')
+    return values.where(~is_percent, values / 100)
+
+def parse_dates(raw_dates):
+    # raw_dates 為已去除空白的字串；標準格式一次解析，少數手動輸入的非標準日期 (例如 2024/5/1) 才逐筆解析
+    parsed = pd.to_datetime(raw_dates, format="%Y-%m-%d", errors="coerce")
+    fallback = parsed.isna() & (raw_dates != "")
+    if fallback.any():
+        parsed[fallback] = pd.to_datetime(raw_dates[fallback], errors="coerce")
+    return parsed
+
+def decode_reports(report_data):
+    # 回傳 (型別化 DataFrame, 異常值清單)；空白視為 0，無法解析的值保留為 NaN 並列入異常清單
+    df = pd.DataFrame(report_data)
+    if df.empty or '日期' not in df.columns:
+        return pd.DataFrame(), pd.DataFrame(columns=ISSUE_COLUMNS)
+
+    issues = []
+    raw_dates = df['日期'].astype(str).str.strip()
+    raw_depts = df['部門'].astype(str) if '部門' in df.columns else pd.Series("", index=df.index)
+    # 列號對應 Google Sheets 實際列號：以讀取時記下的列號為準 (去重後索引已不連續)，剛寫入尚未重新讀取的紀錄沒有列號
+    if ROW_FIELD in df.columns:
+        row_numbers = df.pop(ROW_FIELD)
+    else:
+        row_numbers = pd.Series(df.index + 2, index=df.index)
+
+    def collect(col, bad_mask, raw, reason):
+        for idx in bad_mask[bad_mask].index:
+            row_number = int(row_numbers[idx]) if pd.notna(row_numbers[idx]) else ""
+            issues.append((row_number, raw_dates[idx], raw_depts[idx], col, raw[idx], reason))
+
+    for col in df.columns:
+        dtype = COLUMN_TYPES.get(col)
+        if dtype is None:
+            continue
+        raw = df[col]
+        blank = raw.isna() | (raw.astype(str).str.strip() == "")
+        if dtype == "date":
+            parsed = parse_dates(raw_dates.where(~blank, ""))
+            collect(col, parsed.isna() & ~blank, raw, "日期格式錯誤")
+            df[col] = parsed
+        elif dtype in ("int", "float"):
+            parsed = pd.to_numeric(raw, errors="coerce")
+            collect(col, parsed.isna() & ~blank, raw, "非數值")
+            df[col] = parsed.mask(blank, 0).astype("float64")
+        elif dtype == "ratio":
+            parsed = _parse_ratio(raw)
+            collect(col, parsed.isna() & ~blank, raw, "比例格式錯誤")
+            df[col] = parsed.mask(blank, 0).astype("float64")
+        else:
+            df[col] = raw.astype(str).where(~raw.isna(), "")
+
+    df = df.dropna(subset=['日期'])
+    return df, pd.DataFrame(issues, columns=ISSUE_COLUMNS)
+
+# --- Procurement 叫貨明細：讀取時為原始字串，叫貨單彙整與食材成本共用這一套型別轉換 ---
+
+PROCUREMENT_AMOUNT_COLUMNS = ['單價', '數量', '總價']
+
+def decode_procurement(proc_df):
+    # 日期無法解析的列略過；金額去除千分位逗號 ("1,200" → 1200)，空白視為 0，無法解析者保留為 NaN
+    if proc_df is None:
+        proc_df = pd.DataFrame(columns=PROCUREMENT_COLUMNS)
+    df = pd.DataFrame(index=proc_df.index)
+    for col in PROCUREMENT_COLUMNS:
+        raw = proc_df[col] if col in proc_df.columns else pd.Series("", index=proc_df.index)
+        text = raw.fillna("").astype(str).str.strip()
+        if col == '日期':
+            df[col] = parse_dates(text)
+        elif col in PROCUREMENT_AMOUNT_COLUMNS:
+            values = pd.to_numeric(text.str.replace(',', '', regex=False), errors='coerce')
+            df[col] = values.mask(text == "", 0).astype("float64")
+        else:
+            df[col] = text
+    return df.dropna(subset=['日期']).reset_index(drop=True)
+
+# --- 舊資料移轉：將 "12.3%" 字串改存為數值比例，並補齊標題列 ---
+
+def plan_migration(all_values):
+    # 回傳 (需更新的欄位 {欄名: (欄位索引, 新欄值清單)}, 異常值清單)；只處理比例欄，其餘欄位型別由載入時檢查
+    header = all_values[0] if all_values else []
+    body = all_values[1:]
+    updates = {}
+    issues = []
+    for col in RATIO_COLUMNS:
+        if col not in header:
+            continue
+        col_idx = header.index(col)
+        raw = pd.Series([row[col_idx] if len(row) > col_idx else "" for row in body], dtype=object)
+        parsed = _parse_ratio(raw)
+        blank = raw.astype(str).str.strip() == ""
+        for idx in parsed[parsed.isna() & ~blank].index:
+            row = body[idx]
+            issues.append((int(idx) + 2, row[0] if row else "", row[1] if len(row) > 1 else "", col, raw[idx], "比例格式錯誤"))
+        if raw.astype(str).str.contains('%', regex=False).any():
+            new_values = [
+                "" if is_blank else (raw[i] if pd.isna(v) else encode_ratio(v))
+                for i, (v, is_blank) in enumerate(zip(parsed, blank))
+            ]
+            updates[col] = (col_idx, new_values)
+    return updates, pd.DataFrame(issues, columns=ISSUE_COLUMNS)
+
+def run_migration(db, apply=False):
+    all_values = db.get_sheet_values("Sheet1")
+    if all_values is None:
+        return False, "連線失敗", pd.DataFrame(columns=ISSUE_COLUMNS)
+
+    updates, issues = plan_migration(all_values)
+    expected_header = SHEET_COLUMNS + VERSION_COLUMNS
+    header = all_values[0] if all_values else []
+    header_ok = header[:len(expected_header)] == expected_header
+    current_version = db.get_meta("schema_version")
+
+    summary = (f"目前格式版本：{current_version or 1}，目標版本：{SCHEMA_VERSION}；"
+               f"需轉換比例欄位：{', '.join(updates) or '無'}；標題列{'正確' if header_ok else '需修正'}；異常值 {len(issues)} 筆")
+    if not apply:
+        return True, summary, issues
+
+    if not header_ok:
+        success, msg = db.update_sheet_range("Sheet1", f"A1:{col_letter(len(expected_header))}1", [expected_header])
+        if not success:
+            return False, msg, issues
+    for col, (col_idx, new_values) in updates.items():
+        letter = col_letter(col_idx + 1)
+        success, msg = db.update_sheet_range("Sheet1", f"{letter}2:{letter}{len(new_values) + 1}", [[v] for v in new_values])
+        if not success:
+            return False, msg, issues
+    # 比例欄以一般數字格式顯示：百分比格式會讓讀取 (格式化值) 又變回 "12.3%" 字串並只剩一位小數
+    # 先前已套用百分比格式的試算表，重新執行移轉即可改回
+    for col in RATIO_COLUMNS:
+        letter = col_letter(SHEET_COLUMNS.index(col) + 1)
+        success, msg = db.format_sheet_range("Sheet1", f"{letter}2:{letter}", {"numberFormat": {"type": "NUMBER", "pattern": "0.0000"}})
+        if not success:
+            return False, msg, issues
+    success, msg = db.set_meta("schema_version", SCHEMA_VERSION)
+    if not success:
+        return False, msg, issues
+    return True, summary + "，已完成移轉。", issues
+
+def main(argv=None):
+    import streamlit as st
+    from data_service import get_data_service
+
+    parser = argparse.ArgumentParser(description="Sheet1 儲存格式檢查與移轉")
+    parser.add_argument("--apply", action="store_true", help="實際寫回 Google Sheets (預設只檢查不寫入)")
+    args = parser.parse_args(argv)
+
+    service = get_data_service(st.secrets)
+    success, summary, issues = run_migration(service.db, apply=args.apply)
+    if success and args.apply:
+        # 通知正在執行的網頁程序重新讀取報表
+        service.invalidate("reports")
+    print(summary)
+    if not issues.empty:
+        print(issues.to_string(index=False))
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
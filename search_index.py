@@ -0,0 +1,172 @@
+import datetime
+import re
+import threading
+import unicodedata
+import pandas as pd
+
+# --- 營運知識搜尋：日報與週報文字欄位的倒排索引 ---
+# 中文沒有空白斷詞，以「單字 + 相鄰兩字」為索引詞；英數字則以整個單字為索引詞
+
+DAILY_FIELDS = ['營運回報', '客訴原因與處理結果', '事項宣達']
+WEEKLY_FIELDS = ['數據與營運檢討', '團隊與人事狀況', '行銷觀察與改善建議', '下週行動方針']
+EMPTY_TEXT = {"", "無", "nan", "None"}
+RESULT_COLUMNS = ['日期', '部門', '來源', '欄位', '客訴分類', '摘要', '相關度']
+SNIPPET_CHARS = 40
+
+_TOKEN_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[0-9a-z]+')
+
+def normalize(text):
+    # 全形轉半形、英文轉小寫，查詢與索引使用同一套規則
+    return unicodedata.normalize('NFKC', str(text)).lower()
+
+def _is_cjk(run):
+    return not run[0].isascii()
+
+def tokenize(text):
+    tokens = []
+    for run in _TOKEN_RE.findall(normalize(text)):
+        if _is_cjk(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+def query_tokens(term):
+    # 查詢時中文只取相鄰兩字 (單一字才取單字)，候選文件較少；最後再以原字串比對排除誤判
+    tokens = []
+    for run in _TOKEN_RE.findall(normalize(term)):
+        if _is_cjk(run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+def _parse_tags(tags_str):
+    return tuple(t.strip() for t in str(tags_str).split(',') if t.strip() and t.strip() not in EMPTY_TEXT)
+
+def _to_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value).strip()[:10])
+    except ValueError:
+        return None
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs = {}      # 文件編號 -> 欄位資料 (日期、部門、來源、欄位、標籤、原文、正規化文字)
+        self._keys = {}      # (來源, 日期, 部門, 填寫人, 欄位) -> 文件編號
+        self._postings = {}  # 索引詞 -> 文件編號集合
+        self._next_id = 0
+
+    @classmethod
+    def from_data(cls, report_df, weekly_df):
+        index = cls()
+        if report_df is not None and not report_df.empty:
+            tags = report_df['客訴分類標籤'] if '客訴分類標籤' in report_df.columns else pd.Series("", index=report_df.index)
+            for field in DAILY_FIELDS:
+                if field not in report_df.columns:
+                    continue
+                for day, dept, tag_str, text in zip(report_df['日期'], report_df['部門'], tags, report_df[field]):
+                    index._add(("日報", _to_date(day), str(dept), "", field), _parse_tags(tag_str), text)
+        if weekly_df is not None and not weekly_df.empty:
+            for field in WEEKLY_FIELDS:
+                for day, dept, author, text in zip(weekly_df['回報日'], weekly_df['部門'], weekly_df['填寫人'], weekly_df[field]):
+                    index._add(("週報", _to_date(day), str(dept), str(author), field), (), text)
+        return index
+
+    def _add(self, key, tags, text):
+        text = str(text).strip()
+        if key[1] is None:
+            return
+        old_id = self._keys.pop(key, None)
+        if old_id is not None:
+            for token in self._docs.pop(old_id)['詞']:
+                posting = self._postings.get(token)
+                if posting is not None:
+                    posting.discard(old_id)
+                    if not posting:
+                        del self._postings[token]
+        if text in EMPTY_TEXT:
+            return
+
+        doc_id = self._next_id
+        self._next_id += 1
+        tokens = frozenset(tokenize(text))
+        self._docs[doc_id] = {
+            '來源': key[0], '日期': key[1], '部門': key[2], '欄位': key[4],
+            '標籤': tags, '原文': text, '正規化': normalize(text), '詞': tokens,
+        }
+        self._keys[key] = doc_id
+        for token in tokens:
+            self._postings.setdefault(token, set()).add(doc_id)
+
+    def upsert_daily(self, day, dept, tags_str, fields):
+        # 日報提交 (新增或覆寫) 後更新該日該分店的文字欄位
+        tags = _parse_tags(tags_str)
+        with self._lock:
+            for field, text in fields.items():
+                self._add(("日報", _to_date(day), str(dept), "", field), tags, text)
+
+    def upsert_weekly(self, day, dept, author, fields):
+        with self._lock:
+            for field, text in fields.items():
+                self._add(("週報", _to_date(day), str(dept), str(author), field), (), text)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def search(self, query, departments=None, start=None, end=None, tags=None, sources=None, limit=200):
+        # 以空白分隔多個關鍵字，需全部出現 (AND)；依出現次數與日期排序
+        terms = [normalize(t) for t in str(query).split() if t.strip()]
+        token_lists = [query_tokens(t) for t in terms]
+        if not terms or not all(token_lists):
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+
+        with self._lock:
+            postings = [self._postings.get(token, set()) for tokens in token_lists for token in tokens]
+            postings.sort(key=len)
+            candidates = set(postings[0]).intersection(*postings[1:]) if postings else set()
+            docs = [self._docs[doc_id] for doc_id in candidates]
+
+        wanted_tags = set(tags or [])
+        rows = []
+        for doc in docs:
+            if departments is not None and doc['部門'] not in departments:
+                continue
+            if start is not None and doc['日期'] < start:
+                continue
+            if end is not None and doc['日期'] > end:
+                continue
+            if sources is not None and doc['來源'] not in sources:
+                continue
+            if wanted_tags and not wanted_tags.intersection(doc['標籤']):
+                continue
+            # 索引詞交集可能把不相鄰的字湊在一起，以原字串確認每個關鍵字確實出現
+            counts = [doc['正規化'].count(t) for t in terms]
+            if not all(counts):
+                continue
+            rows.append({
+                '日期': doc['日期'], '部門': doc['部門'], '來源': doc['來源'], '欄位': doc['欄位'],
+                '客訴分類': "、".join(doc['標籤']) or "-",
+                '摘要': _snippet(doc['原文'], doc['正規化'], terms[0]),
+                '相關度': sum(counts),
+            })
+
+        if not rows:
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+        result = pd.DataFrame(rows).sort_values(['相關度', '日期'], ascending=[False, False])
+        return result.head(limit)[RESULT_COLUMNS].reset_index(drop=True)
+
+def _snippet(text, normalized, term):
+    # NFKC 正規化不改變中文字數，正規化文字中的位置可直接對應原文
+    pos = normalized.find(term)
+    if pos < 0 or len(normalized) != len(text):
+        return text[:SNIPPET_CHARS * 2] + ("…" if len(text) > SNIPPET_CHARS * 2 else "")
+    begin = max(pos - SNIPPET_CHARS, 0)
+    end = min(pos + len(term) + SNIPPET_CHARS, len(text))
+    return ("…" if begin > 0 else "") + text[begin:end].replace("\n", " ") + ("…" if end < len(text) else "")
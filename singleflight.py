@@ -0,0 +1,66 @@
+import threading
+from contextlib import contextmanager
+
+# --- 程序內併發工具：相同請求合併為一次執行，同一鍵值的寫入依序進行 ---
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    # 同一個 key 正在執行時，後到的呼叫直接等待並共用同一份結果，不再重複打 API
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+class KeyedLock:
+    # 只鎖定同一個 key (例如同一天同一分店)，不同分店的寫入彼此不會互相阻塞
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    @contextmanager
+    def hold(self, key):
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        entry[0].acquire()
+        try:
+            yield
+        finally:
+            entry[0].release()
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
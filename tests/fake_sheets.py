@@ -0,0 +1,97 @@
+import random
+import re
+import threading
+import time
+
+# --- 測試用的記憶體工作表：模擬 gspread Worksheet 的讀寫介面，每次呼叫前隨機延遲以打亂多執行緒的交錯順序 ---
+
+def _a1(ref):
+    letters, row = re.match(r'([A-Z]+)(\d+)', ref).groups()
+    col = 0
+    for ch in letters:
+        col = col * 26 + ord(ch) - 64
+    return int(row), col
+
+class Cell:
+    def __init__(self, row, col, value):
+        self.row, self.col, self.value = row, col, value
+
+class FakeWorksheet:
+    def __init__(self, header, rows=(), jitter=0.002, seed=None):
+        self.rows = [list(header)] + [[str(v) for v in row] for row in rows]
+        self.jitter = jitter
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+            delay = self._random.random() * self.jitter
+        if delay:
+            time.sleep(delay)
+
+    def get_all_values(self):
+        self._call()
+        with self._lock:
+            return [list(row) for row in self.rows]
+
+    def row_values(self, row_idx):
+        self._call()
+        with self._lock:
+            return list(self.rows[row_idx - 1]) if row_idx <= len(self.rows) else []
+
+    def append_row(self, row):
+        self._call()
+        with self._lock:
+            self.rows.append([str(v) for v in row])
+
+    def range(self, ref):
+        self._call()
+        start, end = ref.split(':')
+        row_idx, first = _a1(start)
+        _, last = _a1(end)
+        with self._lock:
+            row = self.rows[row_idx - 1] if row_idx <= len(self.rows) else []
+            return [Cell(row_idx, c, row[c - 1] if c - 1 < len(row) else "") for c in range(first, last + 1)]
+
+    def update_cells(self, cells):
+        self._call()
+        self._write_cells(cells)
+
+    def update(self, values, range_name):
+        self._call()
+        row_idx, col = _a1(range_name.split(':')[0])
+        self._write_cells([Cell(row_idx + i, col + j, v) for i, row in enumerate(values) for j, v in enumerate(row)])
+
+    def _write_cells(self, cells):
+        with self._lock:
+            for cell in cells:
+                # 列已被刪除 (列號超出範圍) 時與 Sheets 相同，寫到新的空白列
+                while cell.row > len(self.rows):
+                    self.rows.append([])
+                row = self.rows[cell.row - 1]
+                while len(row) < cell.col:
+                    row.append("")
+                row[cell.col - 1] = str(cell.value)
+
+    def delete_rows(self, row_idx):
+        self._call()
+        with self._lock:
+            del self.rows[row_idx - 1]
+
+    def records(self):
+        # 與 get_all_records 相同：以標題列為鍵
+        with self._lock:
+            header = self.rows[0]
+            return [dict(zip(header, row + [""] * (len(header) - len(row)))) for row in self.rows[1:]]
+
+class FakeClient:
+    def __init__(self, sheets):
+        self.sheets = sheets
+
+    def open_by_key(self, sid):
+        return self
+
+    def worksheet(self, name):
+        return self.sheets[name]
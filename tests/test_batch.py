@@ -0,0 +1,50 @@
+import datetime
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# 夜間批次：向量化一次計算全部部門，結果與逐部門的 kpi 函式相同
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import kpi
+from batch import compute_departments, WEEK_FIELDS
+from test_kpi import random_reports
+
+def with_productivity(df):
+    return df.assign(工時產值=kpi.safe_divide(df['總營業額'], df['總工時']))
+
+@pytest.mark.parametrize("seed", range(4))
+def test_compute_departments_matches_per_department_kpis(seed):
+    df = with_productivity(random_reports(seed))
+    departments = sorted(df['部門'].unique()) + ["無資料分店"]
+    targets = {d: 3000000 for d in departments}
+    for date in [datetime.date(2026, 2, 28), datetime.date(2026, 3, 1), datetime.date(2026, 3, 18)]:
+        results = compute_departments(df, departments, date, targets)
+        for dept in departments:
+            daily, weekly, day_row = results[dept]
+            month_rev, month_cust = kpi.month_to_date(df, dept, date, include_day=True)
+            assert (daily['月累計營收'], daily['月累計來客']) == pytest.approx((month_rev, month_cust))
+            assert daily['目標占比'] == pytest.approx(kpi.target_ratio(month_rev, targets[dept]))
+            expected_week = kpi.week_summary(df, dept, date)
+            assert (weekly['週起始日'], weekly['週結束日']) == (expected_week['週起始日'], expected_week['週結束日'])
+            np.testing.assert_allclose([weekly[c] for c in WEEK_FIELDS], [expected_week[c] for c in WEEK_FIELDS], rtol=1e-9, atol=1e-6)
+            day_df = df[(df['部門'] == dept) & (df['日期'] == pd.Timestamp(date))]
+            if day_df.empty:
+                assert day_row is None and daily['總營業額'] == 0.0 and daily['人事成本占比'] == 0.0
+            else:
+                # 同日同分店有多列時與日報相同取最後一列
+                last = day_df.iloc[-1]
+                cost = 0.0 if pd.isna(last['總工時']) else last['總工時'] * last['平均時薪']
+                rev = 0.0 if pd.isna(last['總營業額']) else last['總營業額']
+                assert daily['人事成本'] == pytest.approx(cost)
+                assert daily['人事成本占比'] == pytest.approx(cost / rev if rev > 0 else 0.0)
+                assert day_row.equals(day_df.iloc[-1])
+                assert daily['總營業額'] == pytest.approx(float(day_df.iloc[-1]['總營業額']), nan_ok=True)
+
+def test_compute_departments_on_empty_frame():
+    results = compute_departments(pd.DataFrame(), ["分店0"], datetime.date(2026, 3, 31), {})
+    daily, weekly, day_row = results["分店0"]
+    assert day_row is None and daily['月累計營收'] == 0.0 and weekly['總營業額'] == 0.0
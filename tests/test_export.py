@@ -0,0 +1,53 @@
+import csv
+import os
+import sys
+import pandas as pd
+
+# 匯出：日期區間以解析後的日期篩選，各批欄位一致
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from export import export_reports, iter_report_chunks
+from schema import SHEET_COLUMNS
+
+def record(day, dept="分店0", revenue=1000, **extra):
+    return {'日期': day, '部門': dept, '總營業額': revenue, '版本': 1, '提交編號': "abc:1", **extra}
+
+def read_csv(path):
+    try:
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            return list(csv.reader(f))
+    finally:
+        os.remove(path)
+
+def test_non_iso_dates_are_exported_by_parsed_date():
+    records = [
+        record("2026-01-02"), record("2026/1/7"), record("2026-01-15"), record("2026/1/31"), record("2026-01-20"),
+        record("2025/12/31"), record("2026/2/1"),
+    ]
+    path, row_count, skipped = export_reports(records, "CSV", "2026-01-01", "2026-01-31")
+    rows = read_csv(path)
+    assert row_count == 5 and skipped == 0
+    assert sorted(r[0][:10] for r in rows[1:]) == ["2026-01-02", "2026-01-07", "2026-01-15", "2026-01-20", "2026-01-31"]
+
+def test_unparseable_dates_are_counted_not_silently_dropped():
+    records = [record("2026-01-02"), record("一月七日"), record("2026-01-03", dept="分店1")]
+    path, row_count, skipped = export_reports(records, "CSV", "2026-01-01", "2026-01-31", departments=["分店0"])
+    assert len(read_csv(path)) == 2
+    assert (row_count, skipped) == (1, 1)
+
+def test_chunks_share_columns_when_cached_records_lack_version_columns():
+    records = [record(f"2026-01-{d:02d}", 備註欄="x") for d in range(1, 6)]
+    records.append({'日期': "2026-01-06", '部門': "分店0", '總營業額': 500})
+    chunks = list(iter_report_chunks(records, "2026-01-01", "2026-01-31", chunk_size=2))
+    assert [len(c) for c in chunks] == [2, 2, 2]
+    assert all(list(c.columns) == list(chunks[0].columns) for c in chunks)
+    assert all((c.dtypes == chunks[0].dtypes).all() for c in chunks)
+    assert list(chunks[0].columns[:len(SHEET_COLUMNS)]) == SHEET_COLUMNS
+    last = chunks[-1].iloc[-1]
+    assert last['版本'] == 0 and last['提交編號'] == "" and last['備註欄'] == ""
+
+def test_chunks_outside_range_are_skipped():
+    records = [record("2025-12-01")] * 3 + [record("2026-01-05")]
+    chunks = list(iter_report_chunks(records, pd.Timestamp("2026-01-01").date(), pd.Timestamp("2026-01-31").date(), chunk_size=3))
+    assert [len(c) for c in chunks] == [1]
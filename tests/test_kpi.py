@@ -0,0 +1,117 @@
+import datetime
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# kpi 向量化彙總與逐群組基準公式的一致性測試：隨機資料含同日同分店重複列、0 來客日與營收缺值
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import kpi
+
+SEEDS = range(8)
+
+def random_reports(seed, rows=400, departments=5, days=75):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        '日期': pd.Timestamp("2026-01-20") + pd.to_timedelta(rng.integers(0, days, rows), unit="D"),
+        '部門': rng.choice([f"分店{i}" for i in range(departments)], rows),
+        '總營業額': rng.integers(0, 200000, rows).astype(float),
+        '總來客數': rng.integers(0, 300, rows).astype(float),
+        '總工時': rng.integers(0, 120, rows).astype(float),
+        '平均時薪': rng.choice([190, 205, 220], rows).astype(float),
+    })
+    # 同日同分店重複列、0 來客 / 0 工時 / 0 營收日、營收與工時缺值
+    df = pd.concat([df, df.sample(frac=0.1, random_state=seed)], ignore_index=True)
+    df.loc[rng.random(len(df)) < 0.1, '總來客數'] = 0.0
+    df.loc[rng.random(len(df)) < 0.05, '總工時'] = 0.0
+    df.loc[rng.random(len(df)) < 0.05, '總營業額'] = 0.0
+    df.loc[rng.random(len(df)) < 0.05, '總營業額'] = np.nan
+    df.loc[rng.random(len(df)) < 0.03, '總工時'] = np.nan
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+# --- 基準公式：逐群組計算 ---
+
+def ratio(num, den):
+    return num / den if den > 0 else 0.0
+
+def baseline_group(group):
+    rev, cust, hrs = group['總營業額'].sum(), group['總來客數'].sum(), group['總工時'].sum()
+    cost = (group['總工時'] * group['平均時薪']).sum()
+    return {'總營業額': rev, '總來客數': cust, '總工時': hrs, '人事成本': cost,
+            '客單價': ratio(rev, cust), '工時產值': ratio(rev, hrs), '人事成本占比': ratio(cost, rev)}
+
+def assert_rows_match(expected, actual, columns):
+    np.testing.assert_allclose(actual[columns].to_numpy(dtype=float), expected[columns].to_numpy(dtype=float),
+                               rtol=1e-9, atol=1e-6)
+
+METRICS = ['總營業額', '總來客數', '總工時', '人事成本', '客單價', '工時產值', '人事成本占比']
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_rollup_by_department_and_day(seed):
+    df = random_reports(seed)
+    df = df.assign(日期標籤=df['日期'].dt.strftime('%Y-%m-%d'))
+    expected = pd.DataFrame([{'部門': dept, '日期標籤': day, **baseline_group(g)}
+                             for (dept, day), g in df.groupby(['部門', '日期標籤'])])
+    actual = kpi.rollup(df, ['部門', '日期標籤'])
+    assert list(zip(actual['部門'], actual['日期標籤'])) == list(zip(expected['部門'], expected['日期標籤']))
+    assert_rows_match(expected, actual, METRICS)
+    np.testing.assert_allclose(actual['人事成本數值'], actual['人事成本占比'] * 100)
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_month_summary(seed):
+    df = random_reports(seed)
+    targets = {'分店0': 1000000, '分店1': 0}
+    for month_str in sorted(df['日期'].dt.strftime('%Y-%m').unique()):
+        month_df = df[df['日期'].dt.strftime('%Y-%m') == month_str]
+        expected = pd.DataFrame([{'部門': dept, **baseline_group(g)} for dept, g in month_df.groupby('部門')])
+        expected['達成率'] = [ratio(rev, targets.get(dept, 0)) for dept, rev in zip(expected['部門'], expected['總營業額'])]
+        actual = kpi.month_summary(df, month_str, targets)
+        assert list(actual['部門']) == list(expected['部門'])
+        assert_rows_match(expected, actual, METRICS + ['達成率'])
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_weekly_rollup_matches_week_summary(seed):
+    df = random_reports(seed)
+    actual = kpi.weekly_rollup(df).set_index(['部門', '週起始日'])
+    for (dept, day) in df[['部門', '日期']].drop_duplicates().itertuples(index=False):
+        day = day.date()
+        monday = day - datetime.timedelta(days=day.weekday())
+        week_df = df[(df['部門'] == dept) & (df['日期'] >= pd.Timestamp(monday))
+                     & (df['日期'] <= pd.Timestamp(monday + datetime.timedelta(days=6)))]
+        expected = baseline_group(week_df)
+        row = actual.loc[(dept, pd.Timestamp(monday))]
+        np.testing.assert_allclose([row[c] for c in METRICS], [expected[c] for c in METRICS], rtol=1e-9, atol=1e-6)
+        summary = kpi.week_summary(df, dept, day)
+        np.testing.assert_allclose([summary[c] for c in METRICS], [expected[c] for c in METRICS], rtol=1e-9, atol=1e-6)
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_month_to_date_series(seed):
+    df = random_reports(seed)
+    series = kpi.month_to_date_series(df)
+    assert not series.duplicated(['部門', '日期']).any()
+    for dept, day, mtd_rev, mtd_cust in zip(series['部門'], series['日期'], series['月累計營收'], series['月累計來客']):
+        mask = (df['部門'] == dept) & (df['日期'] >= day.replace(day=1)) & (df['日期'] <= day)
+        np.testing.assert_allclose([mtd_rev, mtd_cust], [df.loc[mask, '總營業額'].sum(), df.loc[mask, '總來客數'].sum()],
+                                   rtol=1e-9, atol=1e-6)
+        # month_to_date 預設不含當日，include_day=True 時與序列相同
+        np.testing.assert_allclose(kpi.month_to_date(df, dept, day.date(), include_day=True), [mtd_rev, mtd_cust], rtol=1e-9)
+        before = mask & (df['日期'] < day)
+        np.testing.assert_allclose(kpi.month_to_date(df, dept, day.date()),
+                                   [df.loc[before, '總營業額'].sum(), df.loc[before, '總來客數'].sum()], rtol=1e-9, atol=1e-6)
+
+def test_month_to_date_on_last_day_of_month():
+    df = pd.DataFrame({'日期': pd.to_datetime(["2026-01-30", "2026-01-31", "2026-02-01"]), '部門': "分店0",
+                       '總營業額': [100.0, 200.0, 400.0], '總來客數': [1.0, 2.0, 4.0]})
+    assert kpi.month_to_date(df, "分店0", datetime.date(2026, 1, 31), include_day=True) == (300.0, 3.0)
+    assert kpi.month_to_date(df, "分店0", datetime.date(2026, 1, 31)) == (100.0, 1.0)
+
+def test_empty_frames():
+    empty = pd.DataFrame(columns=['日期', '部門', '總營業額', '總來客數', '總工時', '平均時薪'])
+    assert kpi.rollup(empty, '部門').empty
+    assert kpi.weekly_rollup(empty).empty
+    assert kpi.month_to_date_series(empty).empty
+    assert kpi.month_summary(empty, "2026-01").empty
+    assert kpi.month_to_date(empty, "分店0", datetime.date(2026, 1, 31)) == (0.0, 0.0)
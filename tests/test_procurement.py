@@ -0,0 +1,35 @@
+import os
+import sys
+import pandas as pd
+
+# 叫貨明細型別化：叫貨單彙整與食材成本使用同一套解析
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from database import PROCUREMENT_COLUMNS
+from schema import decode_procurement
+from orders import build_vendor_orders
+from food_cost import FoodCostIndex
+
+RAW = pd.DataFrame([
+    ["2026-10-01", "分店0", "美福", "和牛", "600", "2", "1,200", "小明", "已叫貨"],
+    ["2026/10/1", "分店0", "美福", "豬梅花", "300", "1", "300", "小華", "已叫貨"],
+    ["2026-10-01", "分店0", "信功", "豬肉", "", "", "abc", "小明", "已叫貨"],
+    ["日期錯誤", "分店0", "美福", "和牛", "1", "1", "1", "小明", "已叫貨"],
+], columns=PROCUREMENT_COLUMNS)
+
+def test_decode_procurement():
+    df = decode_procurement(RAW)
+    assert len(df) == 3
+    assert list(df['總價'].iloc[:2]) == [1200.0, 300.0]
+    assert df['單價'].iloc[2] == 0 and pd.isna(df['總價'].iloc[2])
+    assert decode_procurement(None).empty
+
+def test_orders_and_food_cost_agree_on_formatted_amounts():
+    df = decode_procurement(RAW)
+    orders = {o['廠商']: o for o in build_vendor_orders(df, "2026-10-01")}
+    assert orders['美福']['總價'] == 1500.0
+    assert orders['信功']['總價'] == 0.0
+    index = FoodCostIndex.from_frame(None, df)
+    vendors = index.vendor_breakdown().set_index('廠商')['叫貨成本']
+    assert vendors.to_dict() == {'美福': 1500.0}
@@ -0,0 +1,40 @@
+import datetime
+import os
+import sys
+import pandas as pd
+
+# 月底營收預測：基準日是否已回報、是否有本次輸入的營收
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from projection import ProjectionEngine
+
+def engine(last_day):
+    days = pd.date_range("2026-08-01", last_day)
+    # 星期一公休 (沒有日報)，其他天營收 100
+    days = days[days.weekday != 0]
+    return ProjectionEngine.from_frame(pd.DataFrame({'日期': days, '部門': "A", '總營業額': 100.0}))
+
+def test_reported_day_keeps_saved_revenue_without_entered_revenue():
+    e = engine("2026-09-16")
+    day = datetime.date(2026, 9, 16)
+    result = e.project("A", day, 3000)
+    # 9/1..9/16 已回報 14 天，9/17..9/30 剩 14 天 (含 2 個星期一)
+    assert result['月累計營收'] == 1400
+    assert result['剩餘天數'] == 14
+    assert result['預估月底營收'] == 1400 + 12 * 100
+    assert e.project("A", day, 3000, today_revenue=250)['月累計營收'] == 1400 - 100 + 250
+
+def test_unreported_day_is_projected_from_profile():
+    e = engine("2026-09-15")
+    day = datetime.date(2026, 9, 16)
+    result = e.project("A", day, 3000)
+    assert result['月累計營收'] == 1300
+    assert result['剩餘天數'] == 15
+    assert result['預估月底營收'] == 1300 + 13 * 100
+
+def test_past_as_of_ignores_later_reports():
+    e = engine("2026-09-29")
+    result = e.project("A", datetime.date(2026, 9, 10), 0)
+    assert result['月累計營收'] == 900
+    assert result['預估月底營收'] == 900 + 17 * 100
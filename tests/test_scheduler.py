@@ -0,0 +1,49 @@
+import os
+import sys
+import threading
+
+# 配額排程：寫入流程逐次計算實際送出的請求，各程序的配額份額合計不超過服務帳號上限
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import scheduler
+from scheduler import RequestScheduler, APP_QUOTAS, SHEETS_QUOTA_PER_MINUTE
+from test_upsert import HEADER, manager, submit
+from fake_sheets import FakeWorksheet
+
+def charged(db):
+    return db.scheduler.usage()["used_last_minute"]
+
+def test_upsert_charges_every_sheet_call():
+    sheet = FakeWorksheet(HEADER, jitter=0)
+    db = manager(sheet)
+    submit(db, "第一版")
+    submit(db, "第二版")
+    # 每次提交另計開啟試算表與取得工作表 2 次
+    assert charged(db) == sheet.calls + 2 * 2
+
+def test_contended_upserts_charge_retries_and_marking():
+    sheet = FakeWorksheet(HEADER, seed=3)
+    shared_scheduler = RequestScheduler(quota_per_minute=10 ** 6)
+    writers = []
+    for i in range(3):
+        db = manager(sheet)
+        db.scheduler = shared_scheduler
+        writers.append(threading.Thread(target=submit, args=(db, f"內容{i}")))
+    [t.start() for t in writers]
+    [t.join() for t in writers]
+    assert shared_scheduler.usage()["used_last_minute"] == sheet.calls + 2 * 3
+
+def test_app_quotas_fit_the_service_account_limit():
+    assert sum(APP_QUOTAS.values()) <= SHEETS_QUOTA_PER_MINUTE
+
+def test_configure_sets_process_quota(monkeypatch):
+    original = scheduler.get_scheduler().quota_per_minute
+    try:
+        assert scheduler.configure("procurement").quota_per_minute == APP_QUOTAS["procurement"]
+        monkeypatch.setenv("IKKON_SHEETS_QUOTA_MAIN", "25")
+        bucket = scheduler.configure("main")
+        assert (bucket.quota_per_minute, bucket.capacity) == (25, 25.0)
+        assert bucket.usage()["tokens_available"] <= 25
+    finally:
+        scheduler.get_scheduler().set_quota(original)
@@ -0,0 +1,54 @@
+import os
+import sys
+
+# 舊資料移轉：任何一步寫入失敗都不記錄新的格式版本
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from database import VERSION_COLUMNS
+from schema import SHEET_COLUMNS, SCHEMA_VERSION, run_migration
+
+class FakeDB:
+    def __init__(self, values, fail=None):
+        self.values = values
+        self.fail = fail
+        self.meta = {}
+        self.calls = []
+
+    def get_sheet_values(self, sheet_name):
+        return self.values
+
+    def get_meta(self, key):
+        return self.meta.get(key)
+
+    def _result(self, name):
+        self.calls.append(name)
+        return (False, f"{name} 失敗") if name == self.fail else (True, "success")
+
+    def update_sheet_range(self, sheet_name, range_name, values):
+        return self._result("update")
+
+    def format_sheet_range(self, sheet_name, range_name, cell_format):
+        return self._result("format")
+
+    def set_meta(self, key, value):
+        self.meta[key] = value
+        return self._result("meta")
+
+def sheet_values():
+    row = ["0"] * len(SHEET_COLUMNS)
+    row[0], row[1] = "2026-01-01", "分店0"
+    row[SHEET_COLUMNS.index("人事成本占比")] = "12.3%"
+    return [SHEET_COLUMNS + VERSION_COLUMNS, row + ["1", "a:1"]]
+
+def test_format_failure_does_not_record_schema_version():
+    db = FakeDB(sheet_values(), fail="format")
+    success, msg, _ = run_migration(db, apply=True)
+    assert not success and msg == "format 失敗"
+    assert "schema_version" not in db.meta
+
+def test_successful_migration_records_schema_version():
+    db = FakeDB(sheet_values())
+    success, summary, _ = run_migration(db, apply=True)
+    assert success and db.meta["schema_version"] == SCHEMA_VERSION
+    assert db.calls[-1] == "meta" and "format" in db.calls
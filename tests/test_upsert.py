@@ -0,0 +1,127 @@
+import os
+import sys
+import threading
+import pytest
+
+# 版本化寫入：併發新增同一天同一分店時只留下一列有效資料，落敗的列標記為已取代，之後再由壓縮清除
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import database
+from database import DatabaseManager, dedupe_reports, is_superseded, token_of, SUPERSEDED_PREFIX, ROW_FIELD
+from scheduler import RequestScheduler
+from singleflight import SingleFlight, KeyedLock
+from fake_sheets import FakeWorksheet, FakeClient
+
+HEADER = ["日期", "部門", "內容", "版本", "提交編號"]
+KEY = ("2026-05-01", "分店0")
+TOKEN_COL = 4
+
+def manager(sheet, shared=None):
+    # shared 為 None 時模擬獨立程序：各自的合併與鎖定，只靠試算表上的版本號與提交編號協調
+    db = object.__new__(DatabaseManager)
+    db.sid = "test"
+    db.client = FakeClient({"Sheet1": sheet})
+    db.scheduler = RequestScheduler(quota_per_minute=10 ** 6)
+    db._inflight = shared._inflight if shared else SingleFlight()
+    db._key_locks = shared._key_locks if shared else KeyedLock()
+    return db
+
+def submit(db, content, key=KEY):
+    return db.upsert_report("Sheet1", key[0], key[1], [key[0], key[1], content])
+
+def live_rows(sheet):
+    return [row for row in sheet.rows[1:] if not is_superseded(token_of(row, TOKEN_COL))]
+
+def test_insert_then_update_bumps_version():
+    sheet = FakeWorksheet(HEADER, jitter=0)
+    db = manager(sheet)
+    assert submit(db, "第一版") == (True, "inserted")
+    assert submit(db, "第二版") == (True, "updated")
+    assert len(sheet.rows) == 2
+    assert sheet.rows[1][2:4] == ["第二版", "2"]
+
+def test_resubmitting_same_content_does_not_write_again():
+    sheet = FakeWorksheet(HEADER, jitter=0)
+    db = manager(sheet)
+    submit(db, "內容")
+    token = sheet.rows[1][TOKEN_COL]
+    assert submit(db, "內容") == (True, "updated")
+    assert sheet.rows[1][3:] == ["1", token]
+
+def test_identical_concurrent_submissions_in_one_process_write_once():
+    sheet = FakeWorksheet(HEADER)
+    first = manager(sheet)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(submit(manager(sheet, first), "內容"))) for _ in range(4)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    assert all(success for success, _ in results)
+    assert len(sheet.rows) == 2 and sheet.rows[1][3] == "1"
+
+@pytest.mark.parametrize("writers", [2, 3])
+def test_concurrent_inserts_leave_one_live_row(writers):
+    for trial in range(60):
+        sheet = FakeWorksheet(HEADER, seed=trial)
+        results = [None] * writers
+
+        def run(i):
+            results[i] = submit(manager(sheet), f"內容{i}")
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(writers)]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+
+        live = live_rows(sheet)
+        assert len(live) == 1, sheet.rows
+        # 寫入流程不刪列：每位寫入者新增的列都還在 (有效或已取代)
+        assert len(sheet.rows) - 1 <= writers
+        assert live[0][2] in {f"內容{i}" for i in range(writers)}
+        # 每位寫入者都有明確結果；失敗時附上原因，不會回報成功卻留下重複列
+        assert all(isinstance(success, bool) and message for success, message in results)
+        # 讀取端去重後同樣只有一筆
+        assert len(dedupe_reports(sheet.records())) == 1
+
+def test_mark_superseded_only_touches_own_token_and_is_idempotent():
+    sheet = FakeWorksheet(HEADER, [["2026-05-01", "分店0", "甲", 1, "aaa:1"], ["2026-05-01", "分店0", "乙", 1, "bbb:2"]], jitter=0)
+    db = manager(sheet)
+    assert db._mark_superseded(sheet, "bbb:2", TOKEN_COL)
+    assert db._mark_superseded(sheet, "bbb:2", TOKEN_COL)
+    assert sheet.rows[1][TOKEN_COL] == "aaa:1"
+    assert sheet.rows[2][TOKEN_COL] == SUPERSEDED_PREFIX + "bbb:2"
+    assert sheet.rows[2][:4] == ["2026-05-01", "分店0", "乙", "1"]
+    # 找不到該提交編號 (例如已被壓縮清除) 視為完成
+    assert db._mark_superseded(sheet, "ccc:3", TOKEN_COL)
+
+def test_dedupe_reports_skips_superseded_and_keeps_highest_version():
+    records = [
+        {"日期": "2026-05-01", "部門": "分店0", "內容": "舊", "版本": 1, "提交編號": "a:1"},
+        {"日期": "2026-05-01", "部門": "分店0", "內容": "新", "版本": 2, "提交編號": "b:2"},
+        {"日期": "2026-05-01", "部門": "分店0", "內容": "落敗", "版本": 9, "提交編號": SUPERSEDED_PREFIX + "c:3"},
+        {"日期": "2026-05-02", "部門": "分店0", "內容": "隔天", "版本": 1, "提交編號": "d:4"},
+    ]
+    result = dedupe_reports(records)
+    assert [r["內容"] for r in result] == ["新", "隔天"]
+    assert [r[ROW_FIELD] for r in result] == [3, 5]
+
+def test_compact_superseded_removes_only_marked_rows():
+    rows = [
+        ["2026-05-01", "分店0", "甲", 2, "aaa:1"],
+        ["2026-05-01", "分店0", "乙", 1, SUPERSEDED_PREFIX + "bbb:2"],
+        ["2026-05-02", "分店0", "丙", 1, "ccc:3"],
+        ["2026-05-02", "分店0", "丁", 1, SUPERSEDED_PREFIX + "ddd:4"],
+    ]
+    sheet = FakeWorksheet(HEADER, rows, jitter=0)
+    db = manager(sheet)
+    assert db.compact_superseded("Sheet1") == (True, 2)
+    assert [row[2] for row in sheet.rows[1:]] == ["甲", "丙"]
+    assert db.compact_superseded("Sheet1") == (True, 0)
+
+def test_race_then_compaction_leaves_single_clean_row():
+    sheet = FakeWorksheet(HEADER, seed=1)
+    threads = [threading.Thread(target=submit, args=(manager(sheet), f"內容{i}")) for i in range(3)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    manager(sheet).compact_superseded("Sheet1")
+    assert len(sheet.rows) == 2
+    assert not is_superseded(sheet.rows[1][TOKEN_COL])
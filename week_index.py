@@ -0,0 +1,97 @@
+import threading
+import datetime
+import pandas as pd
+
+# --- 週彙總索引：以 (部門, ISO 年, ISO 週) 為鍵，啟動時建立一次，提交日報時增量更新 ---
+
+WEEK_FIELDS = ['總營業額', '總來客數', '總工時', '人事成本']
+
+def iso_week_key(date):
+    iso = date.isocalendar()
+    return iso[0], iso[1]
+
+def week_start(iso_year, iso_week):
+    return datetime.date.fromisocalendar(iso_year, iso_week, 1)
+
+class WeekIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._days = {}   # (部門, 日期) -> (營收, 來客, 工時, 人事成本)
+        self._weeks = {}  # (部門, ISO 年, ISO 週) -> [營收, 來客, 工時, 人事成本, 天數]
+
+    @classmethod
+    def from_frame(cls, report_df):
+        # report_df 為 schema.decode_reports 型別化後的資料，不需再做數值轉換
+        index = cls()
+        if report_df is None or report_df.empty:
+            return index
+
+        df = report_df[['部門', '日期']].copy()
+        df['日期'] = df['日期'].dt.date
+        df['總營業額'] = report_df['總營業額'].fillna(0)
+        df['總來客數'] = report_df['總來客數'].fillna(0)
+        df['總工時'] = report_df['總工時'].fillna(0)
+        df['人事成本'] = df['總工時'] * report_df['平均時薪'].fillna(0)
+
+        day_df = df.groupby(['部門', '日期'], sort=False)[WEEK_FIELDS].sum()
+        index._days = {
+            key: tuple(float(v) for v in values)
+            for key, values in zip(day_df.index, day_df.to_numpy())
+        }
+        for (dept, day), values in index._days.items():
+            index._add(dept, day, values, 1)
+        return index
+
+    def _add(self, dept, day, values, sign):
+        key = (dept,) + iso_week_key(day)
+        bucket = self._weeks.setdefault(key, [0.0] * (len(WEEK_FIELDS) + 1))
+        for i, v in enumerate(values):
+            bucket[i] += sign * v
+        bucket[-1] += sign
+        if bucket[-1] <= 0:
+            del self._weeks[key]
+
+    def upsert_day(self, dept, day, revenue, customers, hours, labor_cost):
+        new_values = (float(revenue), float(customers), float(hours), float(labor_cost))
+        with self._lock:
+            old_values = self._days.get((dept, day))
+            if old_values is not None:
+                self._add(dept, day, old_values, -1)
+            self._days[(dept, day)] = new_values
+            self._add(dept, day, new_values, 1)
+
+    def week(self, dept, day):
+        with self._lock:
+            bucket = self._weeks.get((dept,) + iso_week_key(day))
+        return _week_metrics(bucket)
+
+    def trend(self, dept, day, weeks=12):
+        iso_year, iso_week = iso_week_key(day)
+        end_monday = week_start(iso_year, iso_week)
+        rows = []
+        with self._lock:
+            for offset in range(weeks - 1, -1, -1):
+                monday = end_monday - datetime.timedelta(weeks=offset)
+                bucket = self._weeks.get((dept,) + iso_week_key(monday))
+                metrics = _week_metrics(bucket)
+                metrics['週起始日'] = monday
+                metrics['週別'] = "W{1:02d}".format(*iso_week_key(monday))
+                rows.append(metrics)
+
+        trend_df = pd.DataFrame(rows)
+        for col in ['總營業額', '客單價', '工時產值', '人事成本占比']:
+            prev = trend_df[col].shift(1)
+            trend_df[f'{col}週增減'] = (trend_df[col] - prev) / prev.where(prev > 0)
+        return trend_df
+
+def _week_metrics(bucket):
+    rev, cust, hrs, cost, days = bucket if bucket else (0.0, 0.0, 0.0, 0.0, 0)
+    return {
+        '總營業額': rev,
+        '總來客數': cust,
+        '總工時': hrs,
+        '營業天數': int(days),
+        '客單價': rev / cust if cust > 0 else 0.0,
+        '工時產值': rev / hrs if hrs > 0 else 0.0,
+        '人事成本占比': cost / rev if rev > 0 else 0.0,
+    }